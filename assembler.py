@@ -0,0 +1,97 @@
+import queue
+import threading
+
+import video
+from config import logger
+
+
+class PrefixAssembler(object):
+    '''
+    Prefix assembler class - writes shards out in playback order while the
+    VJ is still receiving the rest
+
+    The VJ appends each shard as soon as every shard before it is in (the
+    contiguous prefix grows), and a writer thread hands it on in the
+    background - straight into one ffmpeg process when the shards can be
+    piped (see video.can_pipe), otherwise into a shard file. Once the last
+    shard arrives only the tail is left to write.
+    '''
+
+    def __init__(self, name='concat_all'):
+        '''
+        Args:
+            name: Name of the assembled video file
+        '''
+        self.__name = name
+        self.__shards = queue.Queue()  # (shard_id, byte_data), None once the VJ has all shards
+        self.__file_paths = []
+        self.__pipe = None  # the ffmpeg process the shards are piped into
+        self.__output_file = None
+        self.__num_appended = 0
+        self.__error = None  # what stopped the writer thread, re-raised by finish
+        self.__writer = threading.Thread(target=self.__write_shards, name='PrefixAssembler', daemon=True)
+        self.__writer.start()
+
+    def num_appended(self):
+        return self.__num_appended
+
+    def file_paths(self):
+        '''Get the shard files written so far (none when piping)'''
+        return self.__file_paths
+
+    def append(self, shard_id, byte_data):
+        '''
+        Queue the next shard in playback order for writing
+
+        Args:
+            shard_id: ID of the shard, must be num_appended()
+            byte_data: The shard's byte data
+        '''
+        if shard_id != self.__num_appended:
+            raise ValueError(f'shard {shard_id} appended out of order, expected {self.__num_appended}')
+        self.__num_appended += 1
+        self.__shards.put((shard_id, byte_data))
+
+    def finish(self):
+        '''
+        Wait for the writer thread to write everything appended so far, then
+        finish the video
+
+        Returns:
+            str: Path to the assembled video file
+        '''
+        self.__shards.put(None)
+        self.__writer.join()
+        if self.__error is not None:
+            if self.__pipe is not None:
+                self.__pipe.kill()
+            raise self.__error
+
+        if self.__pipe is not None:
+            video.close_pipe(self.__pipe)
+            logger.info(f'Prefix assembler piped {self.__num_appended} shards into ffmpeg')
+            return self.__output_file
+
+        logger.info(f'Prefix assembler wrote {len(self.__file_paths)} shards')
+        return video.concat(self.__name, *self.__file_paths)
+
+    def __write_shards(self):
+        try:
+            while True:
+                shard = self.__shards.get()
+                if shard is None:
+                    return
+                shard_id, byte_data = shard
+
+                # The first shard decides where they all go
+                if shard_id == 0 and video.can_pipe(byte_data):
+                    self.__pipe, self.__output_file = video.open_pipe(self.__name)
+
+                if self.__pipe is not None:
+                    self.__pipe.stdin.write(byte_data)
+                else:
+                    self.__file_paths.append(video.write(f'shard_{shard_id}', byte_data))
+                logger.debug(f'Prefix assembler wrote shard {shard_id}')
+        except BaseException as e:
+            # e.g. SystemExit from a file that can't be written, or ffmpeg exiting early
+            self.__error = e
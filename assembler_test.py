@@ -0,0 +1,37 @@
+import io
+from unittest.mock import Mock, patch
+
+import assembler
+import pytest
+
+
+@patch('config.VJ_OUTPUT', 'files')
+def test_append_finish(tmp_path):
+    with patch('config.TEMP_DIR', str(tmp_path)), patch('video.concat', return_value='out.mp4') as concat:
+        a = assembler.PrefixAssembler()
+        a.append(0, b'beef')
+        a.append(1, b'cafe')
+        assert a.num_appended() == 2
+        assert a.finish() == 'out.mp4'
+    file_paths = a.file_paths()
+    concat.assert_called_once_with('concat_all', *file_paths)
+    assert [open(file_path, 'rb').read() for file_path in file_paths] == [b'beef', b'cafe']
+
+
+def test_append_out_of_order():
+    a = assembler.PrefixAssembler()
+    with pytest.raises(ValueError):
+        a.append(1, b'cafe')
+
+
+@patch('config.VJ_OUTPUT', 'pipe')
+def test_pipe():
+    process = Mock(stdin=io.BytesIO())
+    with patch('video.open_pipe', return_value=(process, 'out.mp4')), patch('video.close_pipe') as close_pipe:
+        a = assembler.PrefixAssembler()
+        a.append(0, b'beef')
+        a.append(1, b'cafe')
+        assert a.finish() == 'out.mp4'
+    close_pipe.assert_called_once_with(process)
+    assert process.stdin.getvalue() == b'beefcafe'
+    assert a.file_paths() == []
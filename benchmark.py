@@ -0,0 +1,206 @@
+import argparse
+import multiprocessing
+import statistics
+import struct
+import time
+from multiprocessing import managers
+
+import config
+import transport as tr
+from config import logger
+
+# every benchmark shard starts with the time.time() it was handed to the transport
+TIMESTAMP = struct.Struct('<d')
+
+
+def count_manager_rpcs():
+    '''
+    Count the manager round trips made by this process
+
+    Returns:
+        list: one-element list holding the running count
+    '''
+    counter = [0]
+    callmethod = managers.BaseProxy._callmethod
+
+    def counting_callmethod(self, methodname, args=(), kwds={}):
+        counter[0] += 1
+        return callmethod(self, methodname, args, kwds)
+
+    managers.BaseProxy._callmethod = counting_callmethod
+    return counter
+
+
+def poll_send(shared_buffer, sender_name, shard_id, byte_data):
+    '''Baseline: the 1 ms round-robin polling loop the fans used to run'''
+    slot_index = 0
+    while True:
+        lock = shared_buffer.lock(slot_index)
+        if lock.acquire(False):
+            try:
+                if shared_buffer.is_slot_empty(slot_index):
+                    shared_buffer.write_to_slot(slot_index, sender_name, shard_id, byte_data)
+                    return slot_index
+            finally:
+                lock.release()
+        slot_index = (slot_index + 1) % config.SHARED_BUFFER_SIZE
+        time.sleep(0.001)
+
+
+def poll_receive(shared_buffer):
+    '''Baseline: the 1 ms round-robin polling loop the VJ used to run'''
+    slot_index = 0
+    while True:
+        lock = shared_buffer.lock(slot_index)
+        if lock.acquire(False):
+            try:
+                if shared_buffer.is_slot_full(slot_index):
+                    sender_name = shared_buffer.sender_name(slot_index)
+                    shard_id = shared_buffer.shard_id(slot_index)
+                    byte_data = bytes(shared_buffer.byte_data(slot_index))
+                    shared_buffer.clear_slot(slot_index)
+                    return (shard_id, byte_data, sender_name)
+            finally:
+                lock.release()
+        slot_index = (slot_index + 1) % config.SHARED_BUFFER_SIZE
+        time.sleep(0.001)
+
+
+def run_fan(transport, mode, fan_id, shard_ids, shard_size, batch, results):
+    '''Benchmark fan process - sends timestamped shards, batch shards per message'''
+    counter = count_manager_rpcs()
+    padding = bytes(shard_size - TIMESTAMP.size)
+    sender_name = f'fan{fan_id}'
+    for i in range(0, len(shard_ids), batch):
+        shards = [(shard_id, TIMESTAMP.pack(time.time()) + padding) for shard_id in shard_ids[i:i + batch]]
+        if mode == 'poll':
+            poll_send(transport, sender_name, shards[0][0], shards[0][1])
+        elif batch > 1:
+            transport.send(sender_name, shards[0][0], tr.pack_batch(shards), 0, tr.BATCH | tr.LAST_CHUNK)
+        else:
+            transport.send(sender_name, shards[0][0], shards[0][1])
+    results.put(('fan', counter[0], [], None))
+
+
+def run_vj(transport, mode, num_shards, prefix_shards, results):
+    '''
+    Benchmark VJ process - receives every shard and records its latency, and
+    when the first prefix_shards shards were all in
+    '''
+    counter = count_manager_rpcs()
+    latencies = []
+    received = [False] * num_shards
+    watermark = 0
+    prefix_time = None
+    while len(latencies) < num_shards:
+        if mode == 'poll':
+            shard_id, byte_data, sender_name = poll_receive(transport)
+            flags = tr.LAST_CHUNK
+        else:
+            shard_id, byte_data, sender_name, seq, flags = transport.receive()
+        shards = [(shard_id, byte_data)]
+        if flags & tr.BATCH:
+            shards = tr.unpack_batch(byte_data)
+        for shard_id, byte_data in shards:
+            latencies.append(time.time() - TIMESTAMP.unpack_from(byte_data)[0])
+            received[shard_id] = True
+        while watermark < num_shards and received[watermark]:
+            watermark += 1
+        if mode != 'poll' and config.DELIVERY == 'edf':
+            transport.set_watermark(watermark)
+        if prefix_time is None and watermark >= prefix_shards:
+            prefix_time = time.time()
+    transport.done()
+    results.put(('vj', counter[0], latencies, prefix_time))
+
+
+def run(name, mode, num_shards, num_fans, shard_size, batch=1):
+    '''
+    Push the same num_shards shards from num_fans fan processes through one transport
+
+    Args:
+        name: Transport name (see transport.TRANSPORTS)
+        mode: 'event' for the transport's own handoff, 'poll' for the old
+              polling loop (slot transports only)
+        batch: Number of shards packed into each message (event mode only)
+
+    Returns:
+        dict: shards per second, p50/p99 latency in ms, manager RPCs per shard
+              and ms until the first eighth of the shards were all in
+    '''
+    manager = None
+    if name == 'manager':
+        manager = multiprocessing.Manager()
+    slot_size = batch * (tr.BATCH_RECORD.size + shard_size)
+    transport = tr.create_transport(name, num_fans, manager, slot_size)
+
+    results = multiprocessing.Queue()
+    shard_ids = list(range(num_shards))
+    processes = [multiprocessing.Process(
+        target=run_vj, args=(transport, mode, num_shards, max(num_shards // 8, 1), results))]
+    for i in range(num_fans):
+        processes.append(multiprocessing.Process(
+            target=run_fan, args=(transport.endpoint(i), mode, i, shard_ids[i::num_fans], shard_size, batch, results)))
+
+    start_time = time.time()
+    for p in processes:
+        p.start()
+    rpcs = 0
+    latencies = []
+    for p in processes:
+        role, count, times, prefix_time = results.get()
+        rpcs += count
+        latencies += times
+        if role == 'vj':
+            prefix_ms = (prefix_time - start_time) * 1000
+    for p in processes:
+        p.join()
+    elapsed_time = time.time() - start_time
+
+    transport.close()
+    if manager is not None:
+        manager.shutdown()
+
+    latencies.sort()
+    return {
+        'shards_per_second': num_shards / elapsed_time,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        'rpcs_per_shard': rpcs / num_shards,
+        'prefix_ms': prefix_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark fan -> VJ shard delivery for every transport')
+    parser.add_argument('--shards', type=int, default=config.NUM_SHARDS)
+    parser.add_argument('--fans', type=int, default=config.NUM_FANS)
+    parser.add_argument('--shard-size', type=int, default=256 * 1024)
+    parser.add_argument('--transports', nargs='+', default=tr.TRANSPORTS, choices=tr.TRANSPORTS)
+    parser.add_argument('--batch', type=int, nargs='+', default=[1],
+                        help='shards packed into each message, one run per value')
+    parser.add_argument('--poll', action='store_true',
+                        help='also run the old 1 ms polling loop over the manager and shm slots')
+    parser.add_argument('--delivery', default=config.DELIVERY, choices=['arrival', 'edf'])
+    args = parser.parse_args()
+    config.DELIVERY = args.delivery
+
+    logger.setLevel('WARNING')
+    print(f'{args.shards} shards x {args.shard_size} bytes, {args.fans} fans, '
+          f'{config.SHARED_BUFFER_SIZE} slots, {args.delivery} delivery')
+    print(f'{"transport":<10}{"handoff":<10}{"batch":>6}{"shards/s":>10}{"MB/s":>10}{"p50 ms":>10}{"p99 ms":>10}'
+          f'{"rpcs/shard":>12}{"prefix ms":>11}')
+    for name in args.transports:
+        runs = [('event', batch) for batch in args.batch]
+        if args.poll and name in ['manager', 'shm']:
+            runs = [('poll', 1)] + runs
+        for mode, batch in runs:
+            r = run(name, mode, args.shards, args.fans, args.shard_size, batch)
+            mb_per_second = r['shards_per_second'] * args.shard_size / (1024 * 1024)
+            print(f'{name:<10}{mode:<10}{batch:>6}{r["shards_per_second"]:>10.1f}{mb_per_second:>10.1f}'
+                  f'{r["p50_ms"]:>10.2f}{r["p99_ms"]:>10.2f}{r["rpcs_per_shard"]:>12.1f}{r["prefix_ms"]:>11.2f}')
+
+
+# Main should only execute for the main process
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+import benchmark
+
+
+def test_run_event():
+    r = benchmark.run('shm', 'event', 8, 2, 64)
+    assert r['shards_per_second'] > 0
+    assert r['p99_ms'] >= r['p50_ms']
+
+
+def test_run_poll():
+    poll = benchmark.run('manager', 'poll', 32, 4, 64)
+    event = benchmark.run('manager', 'event', 32, 4, 64)
+    assert event['rpcs_per_shard'] < poll['rpcs_per_shard']
+
+
+def test_run_batch():
+    r = benchmark.run('queue', 'event', 16, 2, 64, 4)
+    assert r['shards_per_second'] > 0
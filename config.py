@@ -18,12 +18,148 @@ logger.setLevel(logging.INFO)  # Change to DEBUG for more detailed output
 FAN_BUFFER_SIZE = 16
 SHARED_BUFFER_SIZE = 4
 
+# how shards are handed to fans
+#   'static'   - each fan streams its own contiguous block of shard ids
+#   'stealing' - fans pull shard ids on demand and steal from the back of the
+#                busiest fan's block once their own is done
+SCHEDULER = 'static'
+
+# how fans read shard files
+#   'read' - read each shard into a bytes object
+#   'mmap' - memory-map each shard and hand the transport a view of the
+#            mapping (the 'shm' and 'lanes' transports then copy page cache
+#            -> slot once)
+#   'pack' - memory-map SHARDS_PACK_FILE_PATH once and hand the transport a
+#            view of each shard in it (sharder must have written the pack)
+FAN_READ_MODE = 'read'
+
+# number of shards a fan asks the os to read ahead (posix_fadvise)
+FAN_READAHEAD = 4
+
+# how fans run
+#   'process' - one process per fan
+#   'asyncio' - fans run as coroutines spread over FAN_WORKERS processes
+#               (use 'shm', 'queue' or 'socket' with hundreds of fans, 'lanes'
+#               allocates shared memory per fan)
+# an asyncio worker runs its fans' disk reads and blocking sends on a pool of
+# FAN_WORKER_THREADS threads, however many fans it hosts. at most that many
+# of its fans have a read or send in flight at once, the rest wait their turn
+FAN_RUNTIME = 'process'
+FAN_WORKERS = 4
+FAN_WORKER_THREADS = 8
+
+# fan -> vj transport
+#   'manager' - slots live in a multiprocessing.Manager list (shard bytes are
+#               pickled through the manager process)
+#   'shm'     - slots live in a multiprocessing.shared_memory block (shard
+#               bytes are copied straight into a fixed-size slot)
+#   'lanes'   - every fan gets its own ring of LANE_SIZE shared memory slots
+#               (NUM_FANS * LANE_SIZE * SHARED_BUFFER_SLOT_SIZE bytes in total)
+#   'queue'   - a bounded multiprocessing.Queue
+#   'socket'  - one Unix domain socket connection per fan (not on Windows)
+TRANSPORT = 'manager'
+LANE_SIZE = 2
+
+# bytes in one 'shm' or 'lanes' slot (larger shards are sent in slot-sized chunks)
+SHARED_BUFFER_SLOT_SIZE = 16 * 1024 * 1024
+
+# stream shards to the vj in chunks of at most CHUNK_SIZE bytes (0 sends
+# whole shards). shared memory slots default to CHUNK_SIZE, so IPC memory
+# no longer depends on the largest shard
+CHUNK_SIZE = 0
+
+# pack up to BATCH_MAX_SHARDS whole shards (BATCH_MAX_BYTES in total) into one
+# transport message. a fan's batch size doubles while its sends wait longer
+# than BATCH_WAIT_TARGET seconds and shrinks back while they don't
+# (BATCH_MAX_SHARDS = 1 turns batching off)
+BATCH_MAX_SHARDS = 8
+BATCH_MAX_BYTES = 4 * 1024 * 1024
+BATCH_WAIT_TARGET = 0.001
+
+# delivery order
+#   'arrival' - the vj takes shards in whatever order fans get them through
+#   'edf'     - earliest deadline first: the vj publishes its watermark (the
+#               lowest shard it's still missing), the 'manager', 'shm' and
+#               'lanes' transports hand the vj the lowest shard waiting, and
+#               fans send their lowest buffered shards first. shards within
+#               EDF_WINDOW of the watermark skip batching
+DELIVERY = 'arrival'
+EDF_WINDOW = 4
+
+# seconds of video the vj needs in order before playback could start, it
+# logs how long that took (PLAYBACK_PREFIX_SHARDS shards when there's no
+# shards json file to get the shard times from)
+PLAYBACK_PREFIX_SECONDS = 10
+PLAYBACK_PREFIX_SHARDS = 8
+
+# seconds a fan or the vj sleeps on the shared buffer before re-checking
+# whether the vj already has all the shards
+SHARED_BUFFER_TIMEOUT = 0.5
+
+# where the vj writes the shard bytes
+#   'auto'  - 'pipe' when the shards are MPEG-TS (their bytes can simply be
+#             joined), otherwise 'files'
+#   'pipe'  - stream the shards in order into one ffmpeg process (no temp files)
+#   'files' - write each shard to a temp file (VJ_WRITE_WORKERS threads at a
+#             time), then concatenate the files
+VJ_OUTPUT = 'auto'
+VJ_WRITE_WORKERS = 8
+
+# how the vj writes the video
+#   'incremental' - shards are written to disk in the background as soon as
+#                   every shard before them is in, only the tail is left once
+#                   the last shard arrives
+#   'batch'       - every shard is written after the last one arrives
+VJ_ASSEMBLY = 'incremental'
+
+# how video.concat joins shards
+#   'auto'   - stream copy (concat demuxer, no re-encode) when every shard has
+#              the same video parameters (see video.probe), otherwise 'filter'
+#   'copy'   - always stream copy
+#   'filter' - always decode and re-encode through the concat filter
+CONCAT_MODE = 'auto'
+
+# how video.audio adds the audio track
+#   'mux'    - map the video and audio streams into one container, stream
+#              copying each one the container can hold (see video.probe)
+#   'filter' - decode and re-encode both through the concat filter
+AUDIO_MODE = 'mux'
+
 # temporary directory for videos
 TEMP_DIR = os.path.join(PROJECT_DIR, 'temp')
 
+# ffprobe output is cached by file path, size and mtime (see probe_cache)
+#   PROBE_CACHE_SIZE      - probes kept in memory by each process
+#   PROBE_CACHE_FILE_PATH - SQLite file shared by every process, None keeps
+#                           the probes in memory only
+#   PROBE_CACHE_TIMEOUT   - seconds to wait for another process holding the file
+PROBE_CACHE_SIZE = 256
+PROBE_CACHE_FILE_PATH = os.path.join(PROJECT_DIR, 'probe_cache.sqlite')
+PROBE_CACHE_TIMEOUT = 5
+
 # url
 URL = 'https://www.youtube.com/watch?v=WU4UxWaf8U8&list=PLIx-eqjsmIuCoHbep0iithAFB6U793VVA'
 
+# youtube.write_video downloads with concurrent range requests (see downloader)
+#   DOWNLOAD_WORKERS    - range requests at a time
+#   DOWNLOAD_PART_SIZE  - bytes per range request (and per resume journal entry)
+#   DOWNLOAD_CHUNK_SIZE - bytes read from the response at a time
+#   DOWNLOAD_RETRIES    - retries of a failed part
+#   DOWNLOAD_TIMEOUT    - seconds before a stalled request fails
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_PART_SIZE = 8 * 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_TIMEOUT = 30
+
+# youtube ingest cache (see ingest_cache) - the stream chosen for every video
+# and its download, checked against a checksum
+#   INGEST_CACHE_TTL - seconds a cached stream stays fresh (its url expires)
+#   INGEST_OFFLINE   - only serve from the cache, never touch the network
+INGEST_CACHE_DIR = os.path.join(PROJECT_DIR, 'ingest_cache')
+INGEST_CACHE_TTL = 6 * 60 * 60
+INGEST_OFFLINE = False
+
 # source hires files
 SOURCE_VIDEO_BASENAME = 'carter-skyers-easiest-goodbye-official-music-video'
 SOURCE_VIDEO_FILE_PATH = os.path.join(PROJECT_DIR, 'video', SOURCE_VIDEO_BASENAME + '.mp4')
@@ -36,6 +172,41 @@ TIME_EPSILON = 0.0000001
 SHARDS_DIR = os.path.join(PROJECT_DIR, 'video_shards')
 SHARDS_JSON_FILE_PATH = os.path.join(SHARDS_DIR, 'shards.json')
 
+# every shard back to back in one file with an offset index (see pack),
+# sharder also writes it when SHARD_PACK is set
+SHARDS_PACK_FILE_PATH = os.path.join(SHARDS_DIR, 'shards.pack')
+SHARD_PACK = False
+
+# content-addressed shard store (see store), None cuts every shard each time
+# sharder keeps every shard there once, by hash, and links the shard files to
+# it, so re-sharding an unchanged source only cuts the shards that changed
+SHARD_STORE_DIR = None
+
+# how sharder cuts the source video
+#   'segment' - one ffmpeg pass over the source with the segment muxer
+#   'seek'    - one ffmpeg per shard seeking straight to its start,
+#               SHARD_WORKERS at a time
+SHARD_MODE = 'segment'
+SHARD_WORKERS = 4
+
+# shard hashing (see video.file_hash)
+#   HASH_CHUNK_SIZE      - bytes read and hashed at a time
+#   HASH_WORKERS         - files hashed at once by video.file_hashes
+#   HASH_CACHE_FILE_PATH - SQLite file keeping the hash of every shard by
+#                          path, size and mtime, None keeps them in memory only
+#   HASH_CACHE_TIMEOUT   - seconds to wait for another process holding the file
+HASH_CHUNK_SIZE = 1024 * 1024
+HASH_WORKERS = 4
+HASH_CACHE_FILE_PATH = os.path.join(SHARDS_DIR, 'hashes.sqlite')
+HASH_CACHE_TIMEOUT = 5
+
+# where sharder puts the shard boundaries
+#   'keyframe' - on the keyframe nearest each even split point, so shards are
+#                cut and joined again with stream copy (the keyframe index is
+#                cached next to the source)
+#   'even'     - evenly spaced (shards are re-encoded)
+SHARD_BOUNDARIES = 'keyframe'
+
 # Simplified logging format for consistent instructor output
 FORMAT = '[%(levelname)-8s] %(message)s'
 logging.basicConfig(format=FORMAT)
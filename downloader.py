@@ -0,0 +1,175 @@
+import http.client
+import json
+import os
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+from config import logger
+
+# the journal next to a download lists the parts already written
+JOURNAL_EXT = '.journal'
+
+
+def journal_path(file_path):
+    '''Get the path of a download's resume journal'''
+    return file_path + JOURNAL_EXT
+
+
+def content_length(url):
+    '''
+    Ask the server for the size of a file and whether it serves byte ranges
+
+    Returns:
+        tuple: (size in bytes or None, True if range requests are accepted)
+    '''
+    request = urllib.request.Request(url, method='HEAD')
+    with urllib.request.urlopen(request, timeout=config.DOWNLOAD_TIMEOUT) as response:
+        size = response.headers.get('Content-Length')
+        ranges = response.headers.get('Accept-Ranges', '') == 'bytes'
+    return (int(size) if size is not None else None, ranges)
+
+
+def plan_parts(size, part_size):
+    '''Split a download into (start, end) byte ranges, end inclusive'''
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+
+class Journal(object):
+    '''
+    Resume journal class - the parts of a download already written, saved
+    after every part so an interrupted download starts where it stopped
+    '''
+
+    def __init__(self, file_path, size, part_size):
+        self.__file_path = journal_path(file_path)
+        self.__size = size
+        self.__part_size = part_size
+        self.__done = set()
+        self.__lock = threading.Lock()
+        try:
+            with open(self.__file_path) as file:
+                journal = json.load(file)
+            # only a journal of the same download, whose file is still there, is resumed
+            if journal['size'] == size and journal['part_size'] == part_size and \
+                    os.path.getsize(file_path) == size:
+                self.__done = set(journal['done'])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def done(self):
+        return self.__done
+
+    def mark_done(self, part):
+        with self.__lock:
+            self.__done.add(part)
+            journal = {'size': self.__size, 'part_size': self.__part_size, 'done': sorted(self.__done)}
+            temp_file_path = self.__file_path + '.tmp'
+            with open(temp_file_path, 'w') as file:
+                json.dump(journal, file)
+            os.replace(temp_file_path, self.__file_path)
+
+    def remove(self):
+        if os.path.exists(self.__file_path):
+            os.remove(self.__file_path)
+
+
+def download_part(url, file_path, start, end):
+    '''Download bytes start-end (inclusive) of url into the same range of file_path'''
+    request = urllib.request.Request(url, headers={'Range': f'bytes={start}-{end}'})
+    with urllib.request.urlopen(request, timeout=config.DOWNLOAD_TIMEOUT) as response, \
+            open(file_path, 'r+b') as file:
+        if response.status != 206:
+            raise IOError(f'range request for bytes {start}-{end} returned status {response.status}')
+        file.seek(start)
+        written = 0
+        while True:
+            chunk = response.read(config.DOWNLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            file.write(chunk)
+            written += len(chunk)
+    if written != end - start + 1:
+        raise IOError(f'got {written} of {end - start + 1} bytes for bytes {start}-{end}')
+
+
+def download_stream(url, file_path):
+    '''Download url in one request (servers that don't serve byte ranges)'''
+    with urllib.request.urlopen(url, timeout=config.DOWNLOAD_TIMEOUT) as response, \
+            open(file_path, 'wb') as file:
+        while True:
+            chunk = response.read(config.DOWNLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            file.write(chunk)
+
+
+def download(url, file_path, size=None, num_workers=None, part_size=None):
+    '''
+    Download url to file_path with num_workers concurrent range requests
+
+    The file is preallocated and every part is written into its own range
+    of it, retried up to DOWNLOAD_RETRIES times. Finished parts go into the
+    resume journal, so downloading the same file again after an interruption
+    only fetches the missing parts.
+
+    Args:
+        url: The file to download
+        file_path: Where to write it
+        size: Size of the file in bytes, asked from the server if None
+        num_workers: Concurrent range requests, defaults to DOWNLOAD_WORKERS
+        part_size: Bytes per range request, defaults to DOWNLOAD_PART_SIZE
+
+    Returns:
+        str: file_path
+    '''
+    if num_workers is None:
+        num_workers = config.DOWNLOAD_WORKERS
+    if part_size is None:
+        part_size = config.DOWNLOAD_PART_SIZE
+
+    try:
+        server_size, ranges = content_length(url)
+    except OSError:
+        if size is None:
+            raise
+        # some servers don't answer HEAD, the range requests check for 206 anyway
+        server_size, ranges = (size, True)
+    if size is None:
+        size = server_size
+    if size is None or not ranges:
+        logger.info(f'downloading {url} in one request (no range requests)')
+        download_stream(url, file_path)
+        return file_path
+
+    journal = Journal(file_path, size, part_size)
+    if not journal.done():
+        # preallocate the whole file
+        with open(file_path, 'wb') as file:
+            file.truncate(size)
+
+    parts = plan_parts(size, part_size)
+    todo = [i for i in range(len(parts)) if i not in journal.done()]
+    logger.info(f'downloading {url} ({size} bytes), {len(todo)} of {len(parts)} parts, {num_workers} at a time')
+
+    def fetch(i):
+        start, end = parts[i]
+        for attempt in range(config.DOWNLOAD_RETRIES + 1):
+            try:
+                download_part(url, file_path, start, end)
+                journal.mark_done(i)
+                return
+            except (OSError, http.client.HTTPException) as e:
+                logger.warning(f'WARNING: part {i} of {url} failed (attempt {attempt + 1}) exception={type(e).__name__}')
+                error = e
+        raise error
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        for future in [executor.submit(fetch, i) for i in todo]:
+            future.result()
+
+    if os.path.getsize(file_path) != size:
+        raise IOError(f'{file_path} is {os.path.getsize(file_path)} bytes, expected {size}')
+    journal.remove()
+    return file_path
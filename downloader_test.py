@@ -0,0 +1,89 @@
+import http.server
+import json
+import os
+import re
+import threading
+
+import pytest
+
+import downloader
+
+DATA = bytes(range(256)) * 400  # 102400 bytes
+
+
+class RangeHandler(http.server.BaseHTTPRequestHandler):
+    '''Serves DATA with byte ranges, the first failures requests drop the connection'''
+
+    ranges = []
+    failures = 0
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(DATA)))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+    def do_GET(self):
+        start, end = map(int, re.match(r'bytes=(\d+)-(\d+)', self.headers['Range']).groups())
+        RangeHandler.ranges.append((start, end))
+        self.send_response(206)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Content-Range', f'bytes {start}-{end}/{len(DATA)}')
+        self.end_headers()
+        if RangeHandler.failures > 0:
+            RangeHandler.failures -= 1
+            # half the part, then the connection drops
+            self.wfile.write(DATA[start:start + (end - start) // 2])
+            return
+        self.wfile.write(DATA[start:end + 1])
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    RangeHandler.ranges = []
+    RangeHandler.failures = 0
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RangeHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/video.mp4'
+    server.shutdown()
+    server.server_close()
+
+
+def test_plan_parts():
+    assert downloader.plan_parts(10, 4) == [(0, 3), (4, 7), (8, 9)]
+
+
+def test_download(url, tmp_path):
+    file_path = str(tmp_path / 'video.mp4')
+    downloader.download(url, file_path, num_workers=4, part_size=10000)
+    with open(file_path, 'rb') as file:
+        assert file.read() == DATA
+    assert len(RangeHandler.ranges) == 11
+    assert not os.path.exists(downloader.journal_path(file_path))
+
+
+def test_download_retry(url, tmp_path):
+    RangeHandler.failures = 2
+    file_path = str(tmp_path / 'video.mp4')
+    downloader.download(url, file_path, num_workers=4, part_size=10000)
+    with open(file_path, 'rb') as file:
+        assert file.read() == DATA
+    assert len(RangeHandler.ranges) == 13
+
+
+def test_download_resume(url, tmp_path):
+    file_path = str(tmp_path / 'video.mp4')
+    # an interrupted download, parts 0-8 written
+    with open(file_path, 'wb') as file:
+        file.write(DATA[:90000] + bytes(len(DATA) - 90000))
+    with open(downloader.journal_path(file_path), 'w') as file:
+        json.dump({'size': len(DATA), 'part_size': 10000, 'done': list(range(9))}, file)
+
+    downloader.download(url, file_path, num_workers=4, part_size=10000)
+    with open(file_path, 'rb') as file:
+        assert file.read() == DATA
+    assert sorted(RangeHandler.ranges) == [(90000, 99999), (100000, len(DATA) - 1)]
@@ -1,6 +1,14 @@
+import asyncio
+import mmap
+import os
+import queue
+import threading
 import time
 
 import config
+import pack
+import sharder
+import transport as tr
 from config import logger
 from faker import Faker
 
@@ -9,21 +17,31 @@ FAKE = Faker()
 
 class Fan(object):
     '''
-    Fan class - reads assigned shards from disk and sends them to shared buffer
+    Fan class - reads assigned shards from disk and sends them to the VJ through a transport
     '''
 
-    def __init__(self, id, shard_ids):
+    def __init__(self, id, shard_ids, scheduler=None):
         '''
         Initialize a fan with an ID and list of shard IDs to process
         
         Args:
             id: Fan identifier (0-15)
             shard_ids: List of shard IDs this fan is responsible for
+            scheduler: Optional scheduler.ShardScheduler the fan pulls its
+                       shards from instead (it may steal other fans' shards)
         '''
         self.__id = id
         self.__name = FAKE.name()
         self.__shard_ids = shard_ids
+        self.__scheduler = scheduler
+        self.__num_read = 0  # shards the streaming reader has taken so far
         self.__buffer = []  # Fan's local buffer (can hold up to 16 shards)
+        # Streaming buffer, created in the fan process by stream_shards
+        self.__prefetched = None  # queue of (shard_id, byte_data), None once all are read
+        self.__free = None  # FAN_BUFFER_SIZE slots, held from disk read until sent
+        self.__stop = None  # set when the VJ has all shards
+        self.__reader_error = None  # what stopped the reader thread, re-raised by the sender
+        self.__pack = None  # pack.Pack, opened in the fan process by the first read in 'pack' mode
 
     def id(self):
         return self.__id
@@ -37,9 +55,51 @@ class Fan(object):
     def shard_ids(self):
         return self.__shard_ids
 
+    def shard_file_path(self, shard_id):
+        '''Get the path of a shard file'''
+        return sharder.shard_file_path(shard_id)
+
+    def advise_shards(self, shard_ids):
+        '''
+        Ask the OS to start reading shard files we'll need soon (no-op where
+        posix_fadvise isn't available)
+        
+        Args:
+            shard_ids: IDs of the upcoming shards
+        '''
+        if config.FAN_READ_MODE == 'pack':
+            self.open_pack().advise(shard_ids)
+            return
+        if not hasattr(os, 'posix_fadvise'):
+            return
+        for shard_id in shard_ids:
+            try:
+                fd = os.open(self.shard_file_path(shard_id), os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+            finally:
+                os.close(fd)
+
+    def open_pack(self):
+        '''Open the pack file (SHARDS_PACK_FILE_PATH) once per fan process'''
+        if self.__pack is None:
+            try:
+                self.__pack = pack.Pack(config.SHARDS_PACK_FILE_PATH)
+            except Exception as e:
+                logger.error(
+                    f'Unable to open {config.SHARDS_PACK_FILE_PATH} exception={type(e).__name__}')
+                quit(-1)
+        return self.__pack
+
     def read_shard_from_disk(self, shard_id):
         '''
         Read a specific shard from disk
+        With FAN_READ_MODE 'mmap' the shard is memory-mapped instead, and
+        byte_data is a memoryview over the mapping, so the transport copies
+        straight from the page cache. With 'pack' it's a view over the pack
+        file, mapped once by the first read
         
         Args:
             shard_id: The ID of the shard to read (0-127)
@@ -47,8 +107,16 @@ class Fan(object):
         Returns:
             tuple: (shard_id, byte_data)
         '''
-        padded = str(shard_id).zfill(4)
-        file_path = config.SHARDS_DIR + '/' + f'shard_{padded}.mp4'
+        if config.FAN_READ_MODE == 'pack':
+            try:
+                byte_data = self.open_pack().shard(shard_id)
+            except KeyError:
+                logger.error(f'Shard {shard_id} is not in {config.SHARDS_PACK_FILE_PATH}')
+                quit(-1)
+            logger.debug(f'Fan {self.__name} (ID:{self.__id}) read shard {shard_id} from the pack')
+            return (shard_id, byte_data)
+
+        file_path = self.shard_file_path(shard_id)
 
         try:
             file = open(file_path, 'rb')
@@ -57,8 +125,14 @@ class Fan(object):
                 f'Unable to open {file_path} exception={type(e).__name__}')
             quit(-1)
 
-        # read the data
-        byte_data = file.read()
+        # read (or map) the data, empty files can't be mapped
+        if config.FAN_READ_MODE == 'mmap' and os.fstat(file.fileno()).st_size > 0:
+            mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            if hasattr(mapping, 'madvise'):
+                mapping.madvise(mmap.MADV_SEQUENTIAL)
+            byte_data = memoryview(mapping)
+        else:
+            byte_data = file.read()
 
         # close file
         file.close()
@@ -79,77 +153,348 @@ class Fan(object):
         
         logger.info(f'Fan {self.__name} (ID:{self.__id}) loaded {len(self.__buffer)} shards into buffer')
 
-    def send_shard_to_shared_buffer(self, shared_buffer, shard_id, byte_data):
+    def messages(self, shards):
         '''
-        Send a shard to the shared buffer
-        Uses a round-robin approach to find an empty slot
-        Blocks until a slot becomes available
+        Split shards into transport messages
+        Several shards are packed into one BATCH message. A single shard larger
+        than CHUNK_SIZE becomes numbered chunks, the last one flagged
+        LAST_CHUNK, so other fans' chunks can interleave with them
         
         Args:
-            shared_buffer: The shared buffer object
+            shards: List of (shard_id, byte_data)
+            
+        Returns:
+            list: (shard_id, byte_data, seq, flags) for each message
+        '''
+        if len(shards) > 1:
+            return [(shards[0][0], tr.pack_batch(shards), 0, tr.BATCH | tr.LAST_CHUNK)]
+        
+        shard_id, byte_data = shards[0]
+        chunk_size = config.CHUNK_SIZE
+        if chunk_size <= 0 or len(byte_data) <= chunk_size:
+            return [(shard_id, byte_data, 0, tr.LAST_CHUNK)]
+        
+        return tr.chunk_message(shard_id, byte_data, chunk_size)
+
+    def send_shard_to_shared_buffer(self, transport, shard_id, byte_data):
+        '''
+        Send a shard to the VJ (in chunks if it's larger than CHUNK_SIZE)
+        Sleeps until the transport can take it (no polling)
+        
+        Args:
+            transport: The transport object (see transport.Transport)
             shard_id: ID of the shard to send
             byte_data: The shard's byte data
         '''
-        sent = False
-        slot_index = 0
+        for message in self.messages([(shard_id, byte_data)]):
+            sent = transport.send(self.__name, *message)
+            if sent is None:
+                break
+        if sent is not None:
+            logger.info(f'Fan {self.__name} (ID:{self.__id}) sent shard {shard_id} to the VJ')
+
+    def send_batch_to_shared_buffer(self, transport, shards):
+        '''
+        Send several whole shards to the VJ as one message (one slot transaction)
         
-        while not sent:
-            # Try to acquire lock for this slot
-            lock = shared_buffer.lock(slot_index)
-            
-            # Try to acquire the lock (non-blocking - pass False as positional arg for Python 3.13 compatibility)
-            if lock.acquire(False):  # Changed from lock.acquire(block=False)
-                try:
-                    # Check if slot is empty
-                    if shared_buffer.is_slot_empty(slot_index):
-                        # Write shard to this slot
-                        shared_buffer.write_to_slot(slot_index, self.__name, shard_id, byte_data)
-                        logger.info(f'Fan {self.__name} (ID:{self.__id}) wrote shard {shard_id} to shared buffer slot {slot_index}')
-                        sent = True
-                    # If slot is full, release lock and try next slot
-                finally:
-                    # Always release the lock
-                    lock.release()
-            
-            if not sent:
-                # Move to next slot (round-robin)
-                slot_index = (slot_index + 1) % config.SHARED_BUFFER_SIZE
-                # Small delay to avoid busy-waiting
-                time.sleep(0.001)
+        Args:
+            transport: The transport object (see transport.Transport)
+            shards: List of (shard_id, byte_data)
+        '''
+        sent = transport.send(self.__name, *self.messages(shards)[0])
+        if sent is not None:
+            shard_ids = [shard_id for shard_id, byte_data in shards]
+            logger.info(f'Fan {self.__name} (ID:{self.__id}) sent shards {shard_ids} to the VJ')
 
-    def send_all_shards(self, shared_buffer):
+    def send_all_shards(self, transport):
         '''
-        Send all shards from the fan's buffer to the shared buffer
+        Send all shards from the fan's buffer to the VJ
+        Small shards are batched, the batch size adapts to how long sends wait
         
         Args:
-            shared_buffer: The shared buffer object
+            transport: The transport object (see transport.Transport)
         '''
-        logger.info(f'Fan {self.__name} (ID:{self.__id}) sending {len(self.__buffer)} shards to shared buffer')
+        logger.info(f'Fan {self.__name} (ID:{self.__id}) sending {len(self.__buffer)} shards to the VJ')
         
-        for shard_id, byte_data in self.__buffer:
-            self.send_shard_to_shared_buffer(shared_buffer, shard_id, byte_data)
+        batch_sizer = tr.BatchSizer()
+        i = 0
+        while i < len(self.__buffer):
+            batch = batch_sizer.take(self.__buffer[i:i + batch_sizer.size()])
+            i += len(batch)
+            
+            start_time = time.time()
+            if len(batch) == 1:
+                shard_id, byte_data = batch[0]
+                self.send_shard_to_shared_buffer(transport, shard_id, byte_data)
+            else:
+                self.send_batch_to_shared_buffer(transport, batch)
+            batch_sizer.observe(time.time() - start_time)
             
             # Check if VJ has all shards (can exit early)
-            if shared_buffer.vj_has_all_shards.value:
+            if transport.is_done():
                 logger.info(f'Fan {self.__name} (ID:{self.__id}) detected VJ has all shards, finishing')
                 break
         
         logger.info(f'Fan {self.__name} (ID:{self.__id}) finished sending all shards')
 
-    def start(self, shared_buffer):
+    def next_shard_id(self):
         '''
-        Main entry point for the fan process
+        Take the next shard to stream, from the scheduler if the fan has one
+        
+        Returns:
+            int: the shard ID, or None once there are none left
+        '''
+        if self.__scheduler is not None:
+            shard_id = self.__scheduler.next_shard(self.__id)
+        elif self.__num_read < len(self.__shard_ids):
+            shard_id = self.__shard_ids[self.__num_read]
+        else:
+            shard_id = None
+        if shard_id is not None:
+            self.__num_read += 1
+        return shard_id
+
+    def upcoming_shard_ids(self, n):
+        '''Get up to n shard IDs the fan expects to stream next'''
+        if self.__scheduler is not None:
+            return self.__scheduler.peek(self.__id, n)
+        return self.__shard_ids[self.__num_read:self.__num_read + n]
+
+    def read_shard_ahead(self):
+        '''
+        Read the next shard from disk, keeping the OS reading FAN_READAHEAD
+        shards ahead of it
+        
+        Returns:
+            tuple: (shard_id, byte_data), or None once there are no shards left
+        '''
+        first = self.__num_read == 0
+        shard_id = self.next_shard_id()
+        if shard_id is None:
+            return None
+        
+        readahead = config.FAN_READAHEAD
+        upcoming = self.upcoming_shard_ids(readahead)
+        self.advise_shards(upcoming if first else upcoming[readahead - 1:])
+        return self.read_shard_from_disk(shard_id)
+
+    def prefetch_shards(self):
+        '''
+        Reader thread - reads assigned shards from disk into the streaming buffer
+        Holds a buffer slot per shard, so at most FAN_BUFFER_SIZE shards are
+        in memory between the disk read and the send
+        '''
+        try:
+            while True:
+                while not self.__free.acquire(True, config.SHARED_BUFFER_TIMEOUT):
+                    if self.__stop.is_set():
+                        return
+                if self.__stop.is_set():
+                    return
+                shard = self.read_shard_ahead()
+                if shard is None:
+                    return
+                self.__prefetched.put(shard)
+        except BaseException as e:
+            # e.g. SystemExit from a missing shard file, only the sender can end the process
+            self.__reader_error = e
+        finally:
+            # Tell the sender there's nothing more to read
+            self.__prefetched.put(None)
+
+    def next_batch(self, pending, batch_sizer, get_nowait, empty, transport):
+        '''
+        Top up pending with whatever is already in the streaming buffer, then
+        take the next batch from the front of it, as BatchSizer allows
+        With DELIVERY 'edf' the fan takes everything that's buffered and sends
+        its lowest shards first. A shard within EDF_WINDOW of the VJ's
+        watermark is urgent and goes out on its own, not in a batch
+        
+        Args:
+            pending: List of (shard_id, byte_data) waiting to be sent (not empty)
+            batch_sizer: The fan's BatchSizer
+            get_nowait: Takes the next shard from the streaming buffer without blocking
+            empty: Exception get_nowait raises when the buffer is empty
+            transport: The transport the batch goes through (for the watermark)
+            
+        Returns:
+            tuple: (batch, all_read) - all_read is True once the reader's end
+                   marker has been taken
+        '''
+        edf = config.DELIVERY == 'edf'
+        all_read = False
+        while edf or len(pending) < batch_sizer.size():
+            try:
+                shard = get_nowait()
+            except empty:
+                break
+            if shard is None:
+                all_read = True
+                break
+            pending.append(shard)
+        
+        if edf:
+            pending.sort(key=lambda shard: shard[0])
+        if edf and pending[0][0] < transport.watermark() + config.EDF_WINDOW:
+            batch = pending[:1]
+        else:
+            batch = batch_sizer.take(pending)
+        del pending[:len(batch)]
+        return batch, all_read
+
+    def finish_batch(self, transport, batch, batch_sizer, wait, free):
+        '''
+        Wrap up a sent batch: adapt the batch size to how long the send waited,
+        unmap mmap'd shards and hand the buffer slots back to the reader
         
         Args:
-            shared_buffer: The shared buffer object
+            transport: The transport the batch went through
+            batch: List of (shard_id, byte_data) that was sent
+            batch_sizer: The fan's BatchSizer
+            wait: Seconds the send took
+            free: The streaming buffer's slot semaphore
+            
+        Returns:
+            bool: True if the VJ has all shards (the fan can stop)
+        '''
+        batch_sizer.observe(wait)
+        for shard_id, byte_data in batch:
+            if isinstance(byte_data, memoryview):
+                byte_data.release()
+            free.release()
+        
+        # Check if VJ has all shards (can exit early)
+        if transport.is_done():
+            logger.info(f'Fan {self.__name} (ID:{self.__id}) detected VJ has all shards, finishing')
+            return True
+        return False
+
+    def stream_shards(self, transport):
+        '''
+        Send shards while the reader thread is still reading the rest from disk
+        The first shard goes out after one disk read. Whatever else is already
+        in the buffer gets batched with it, as BatchSizer allows
+        
+        Args:
+            transport: The transport object (see transport.Transport)
+        '''
+        self.__prefetched = queue.Queue()
+        self.__free = threading.BoundedSemaphore(config.FAN_BUFFER_SIZE)
+        self.__stop = threading.Event()
+        reader = threading.Thread(target=self.prefetch_shards, name=f'Fan-{self.__id}-reader', daemon=True)
+        reader.start()
+        
+        logger.info(f'Fan {self.__name} (ID:{self.__id}) streaming {len(self.__shard_ids)} shards to the VJ')
+        
+        batch_sizer = tr.BatchSizer()
+        pending = []
+        all_read = False
+        num_sent = 0
+        while pending or not all_read:
+            # Wait for the next shard, then take whatever else is ready
+            if not pending:
+                shard = self.__prefetched.get()
+                if shard is None:
+                    break
+                pending.append(shard)
+            batch, end = self.next_batch(pending, batch_sizer, self.__prefetched.get_nowait, queue.Empty, transport)
+            all_read = all_read or end
+            
+            start_time = time.time()
+            if len(batch) == 1:
+                shard_id, byte_data = batch[0]
+                self.send_shard_to_shared_buffer(transport, shard_id, byte_data)
+            else:
+                self.send_batch_to_shared_buffer(transport, batch)
+            num_sent += len(batch)
+            if self.finish_batch(transport, batch, batch_sizer, time.time() - start_time, self.__free):
+                break
+        
+        self.__stop.set()
+        reader.join()
+        if self.__reader_error is not None:
+            raise self.__reader_error
+        logger.info(f'Fan {self.__name} (ID:{self.__id}) finished streaming {num_sent} shards')
+
+    async def stream_shards_async(self, transport):
+        '''
+        asyncio version of stream_shards, for fans hosted by fan_runner
+        Disk reads run in the event loop's thread pool and sends go through an
+        awaitable transport, so one event loop can host many fans
+        
+        Args:
+            transport: The awaitable transport (see transport.AsyncTransport)
+        '''
+        # Each shard holds one of FAN_BUFFER_SIZE slots from its disk read until it's sent
+        prefetched = asyncio.Queue()
+        free = asyncio.Semaphore(config.FAN_BUFFER_SIZE)
+        
+        async def prefetch():
+            try:
+                while True:
+                    await free.acquire()
+                    shard = await asyncio.to_thread(self.read_shard_ahead)
+                    if shard is None:
+                        return
+                    prefetched.put_nowait(shard)
+            finally:
+                # Tell the sender there's nothing more to read
+                prefetched.put_nowait(None)
+        
+        reader = asyncio.create_task(prefetch())
+        
+        batch_sizer = tr.BatchSizer()
+        pending = []
+        all_read = False
+        num_sent = 0
+        while pending or not all_read:
+            # Wait for the next shard, then take whatever else is ready
+            if not pending:
+                shard = await prefetched.get()
+                if shard is None:
+                    break
+                pending.append(shard)
+            batch, end = self.next_batch(pending, batch_sizer, prefetched.get_nowait, asyncio.QueueEmpty, transport)
+            all_read = all_read or end
+            
+            start_time = time.time()
+            for message in self.messages(batch):
+                if await transport.send(self.__name, *message) is None:
+                    break
+            num_sent += len(batch)
+            if self.finish_batch(transport, batch, batch_sizer, time.time() - start_time, free):
+                break
+        
+        reader.cancel()
+        error = (await asyncio.gather(reader, return_exceptions=True))[0]
+        if error is not None and not isinstance(error, asyncio.CancelledError):
+            raise error
+        logger.info(f'Fan {self.__name} (ID:{self.__id}) finished streaming {num_sent} shards')
+
+    async def start_async(self, transport):
+        '''
+        Main entry point for a fan hosted as a coroutine by fan_runner
+        
+        Args:
+            transport: The awaitable transport (see transport.AsyncTransport)
         '''
         logger.info(f'Fan {self.__name} (ID:{self.__id}) started with {len(self.__shard_ids)} shard(s): {self.__shard_ids}')
         
-        # Step 1: Load shards from disk into fan buffer
-        self.load_shards_into_buffer()
+        await self.stream_shards_async(transport)
+        
+        logger.info(f'Fan {self.__name} (ID:{self.__id}) completed!')
+
+    def start(self, transport):
+        '''
+        Main entry point for the fan process
+        
+        Args:
+            transport: The transport object (see transport.Transport)
+        '''
+        logger.info(f'Fan {self.__name} (ID:{self.__id}) started with {len(self.__shard_ids)} shard(s): {self.__shard_ids}')
         
-        # Step 2: Send all shards to shared buffer
-        self.send_all_shards(shared_buffer)
+        # Read shards from disk into a bounded buffer and send them as they arrive
+        self.stream_shards(transport)
         
         logger.info(f'Fan {self.__name} (ID:{self.__id}) completed!')
 
@@ -0,0 +1,60 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import transport as tr
+from config import logger
+
+
+async def run_fans_async(fans, endpoints):
+    '''
+    Run fans as coroutines on the current event loop
+
+    Args:
+        fans: List of fans
+        endpoints: The transport endpoint for each fan
+    '''
+    # disk reads and blocking sends share a fixed pool, not a thread per fan
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=config.FAN_WORKER_THREADS))
+
+    await asyncio.gather(*[f.start_async(tr.AsyncTransport(endpoint))
+                           for f, endpoint in zip(fans, endpoints)])
+
+
+def run_fans(fans, endpoints):
+    '''
+    Main entry point for a fan worker process - hosts many fans on one event loop
+
+    Args:
+        fans: List of fans
+        endpoints: The transport endpoint for each fan
+    '''
+    logger.info(f'Fan worker {multiprocessing.current_process().name} hosting {len(fans)} fans')
+    asyncio.run(run_fans_async(fans, endpoints))
+
+
+def create_fan_workers(fans, transport, num_workers):
+    '''
+    Spread fans round-robin over a fixed number of worker processes
+
+    Args:
+        fans: List of fans
+        transport: The fan -> VJ transport
+        num_workers: Number of worker processes
+
+    Returns:
+        list: The (not yet started) worker processes
+    '''
+    processes = []
+    num_workers = min(num_workers, len(fans))
+    for i in range(num_workers):
+        worker_fans = fans[i::num_workers]
+        endpoints = [transport.endpoint(f.id()) for f in worker_fans]
+        processes.append(multiprocessing.Process(
+            target=run_fans,
+            args=(worker_fans, endpoints),
+            name=f'FanWorker-{i}'
+        ))
+    return processes
@@ -0,0 +1,29 @@
+from unittest.mock import patch
+
+import fan
+import fan_runner
+import transport
+
+
+@patch('config.BATCH_MAX_SHARDS', 1)
+def test_run_fans(tmp_path):
+    for i in range(4):
+        (tmp_path / f'shard_{i:04d}.mp4').write_bytes(bytes([i]) * 8)
+    with patch('config.SHARDS_DIR', str(tmp_path)):
+        fans = [fan.Fan(0, [0, 2]), fan.Fan(1, [1, 3])]
+        t = transport.QueueTransport()
+        fan_runner.run_fans(fans, [t.endpoint(f.id()) for f in fans])
+    received = {}
+    for i in range(4):
+        shard_id, byte_data, sender_name, seq, flags = t.receive(1)
+        received[shard_id] = (byte_data, sender_name)
+    for i in range(4):
+        assert received[i] == (bytes([i]) * 8, fans[i % 2].name())
+
+
+def test_create_fan_workers():
+    fans = [fan.Fan(i, [i]) for i in range(5)]
+    t = transport.QueueTransport()
+    workers = fan_runner.create_fan_workers(fans, t, 2)
+    assert [w.name for w in workers] == ['FanWorker-0', 'FanWorker-1']
+    assert len(fan_runner.create_fan_workers(fans[:1], t, 4)) == 1
@@ -1,7 +1,14 @@
 import multiprocessing
+import queue
+from unittest.mock import patch
+
+import pytest
 
 import fan
+import pack
+import scheduler
 import shared_buffer
+import transport
 
 
 def test_init():
@@ -20,4 +27,93 @@ def test_send_shard():
 def test_str():
     f = fan.Fan(1)
     s = str(f)
-    assert s
\ No newline at end of file
+    assert s
+
+
+@patch('config.FAN_BUFFER_SIZE', 1)
+@patch('config.BATCH_MAX_SHARDS', 1)
+def test_stream_shards(tmp_path):
+    for i in range(3):
+        (tmp_path / f'shard_{i:04d}.mp4').write_bytes(bytes([i]) * 8)
+    with patch('config.SHARDS_DIR', str(tmp_path)):
+        f = fan.Fan(1, [0, 1, 2])
+        t = transport.QueueTransport()
+        f.stream_shards(t)
+    for i in range(3):
+        shard_id, byte_data, sender_name, seq, flags = t.receive(1)
+        assert shard_id == i
+        assert byte_data == bytes([i]) * 8
+        assert sender_name == f.name()
+
+
+def test_stream_shards_missing_shard(tmp_path):
+    (tmp_path / 'shard_0000.mp4').write_bytes(b'beef')
+    with patch('config.SHARDS_DIR', str(tmp_path)):
+        f = fan.Fan(1, [0, 1])
+        t = transport.QueueTransport()
+        with pytest.raises(SystemExit):
+            f.stream_shards(t)
+    shard_id, byte_data, sender_name, seq, flags = t.receive(1)
+    assert shard_id == 0
+
+
+@patch('config.FAN_READ_MODE', 'pack')
+def test_stream_shards_pack(tmp_path):
+    file_paths = []
+    for i in range(3):
+        (tmp_path / f'shard_{i}.mp4').write_bytes(bytes([i]) * 8)
+        file_paths.append(str(tmp_path / f'shard_{i}.mp4'))
+    pack_file_path = str(tmp_path / 'shards.pack')
+    pack.write_pack(pack_file_path, file_paths, ['0123456789abcdef'] * 3)
+    with patch('config.SHARDS_PACK_FILE_PATH', pack_file_path):
+        f = fan.Fan(1, [0, 1, 2])
+        t = transport.QueueTransport()
+        f.stream_shards(t)
+    assert sorted((shard_id, bytes(byte_data)) for shard_id, byte_data, *rest in
+                  [t.receive(1) for i in range(3)]) == [(i, bytes([i]) * 8) for i in range(3)]
+
+
+@patch('config.BATCH_MAX_SHARDS', 1)
+def test_stream_shards_scheduler(tmp_path):
+    for i in range(4):
+        (tmp_path / f'shard_{i:04d}.mp4').write_bytes(bytes([i]) * 8)
+    with patch('config.SHARDS_DIR', str(tmp_path)):
+        s = scheduler.ShardScheduler([[0], [1, 2, 3]])
+        f = fan.Fan(0, [0], s)
+        t = transport.QueueTransport()
+        f.stream_shards(t)
+    # fan 0 steals fan 1's shards from the back
+    assert [t.receive(1)[0] for i in range(4)] == [0, 3, 2, 1]
+
+
+@patch('config.DELIVERY', 'edf')
+@patch('config.EDF_WINDOW', 2)
+def test_next_batch_edf():
+    f = fan.Fan(1, [])
+    t = transport.QueueTransport()
+    batch_sizer = transport.BatchSizer(max_shards=4, max_bytes=64, wait_target=0)
+    batch_sizer.observe(1)
+    buffered = queue.Queue()
+    for shard in [(9, b'e'), (4, b'b'), None]:
+        buffered.put(shard)
+    pending = [(6, b'c')]
+    # the whole buffer is taken and sorted, the batch starts with the lowest shard
+    assert f.next_batch(pending, batch_sizer, buffered.get_nowait, queue.Empty, t) == ([(4, b'b'), (6, b'c')], True)
+    # a shard close to the watermark goes out on its own
+    t.set_watermark(8)
+    pending = [(9, b'e'), (10, b'f')]
+    assert f.next_batch(pending, batch_sizer, buffered.get_nowait, queue.Empty, t) == ([(9, b'e')], False)
+
+
+@patch('config.FAN_READ_MODE', 'mmap')
+def test_read_shard_from_disk_mmap(tmp_path):
+    (tmp_path / 'shard_0000.mp4').write_bytes(b'beef')
+    (tmp_path / 'shard_0001.mp4').write_bytes(b'')
+    with patch('config.SHARDS_DIR', str(tmp_path)):
+        f = fan.Fan(1, [0, 1])
+        f.advise_shards([0, 1, 2])
+        shard_id, byte_data = f.read_shard_from_disk(0)
+        assert isinstance(byte_data, memoryview)
+        assert bytes(byte_data) == b'beef'
+        byte_data.release()
+        assert f.read_shard_from_disk(1) == (1, b'')
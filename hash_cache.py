@@ -0,0 +1,85 @@
+import contextlib
+import os
+import sqlite3
+import threading
+
+import config
+from config import logger
+
+
+class HashCache(object):
+    '''
+    File hash cache class - hashes a file again only once it has changed
+
+    Hashes are keyed by the file's absolute path and checked against its size
+    and mtime. They are kept in memory, and optionally in an SQLite file so
+    unchanged shards aren't hashed again on every startup.
+    '''
+
+    def __init__(self, hash_file, file_path=None):
+        '''
+        Args:
+            hash_file: Function hashing a file, called with its path on a miss
+            file_path: The SQLite file, None keeps the hashes in memory only
+        '''
+        self.__hash_file = hash_file
+        self.__file_path = file_path
+        self.__hashes = {}  # path -> (size, mtime, hash)
+        self.__lock = threading.Lock()
+        self.__num_hashes = 0  # files hashed, for tests and benchmarks
+
+    def num_hashes(self):
+        return self.__num_hashes
+
+    def file_hash(self, file_path):
+        '''Get the hash of a file, hashing it only if it isn't cached'''
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            # nothing to key on, hash_file reports the missing file
+            return self.__hash_file(file_path)
+        path = os.path.abspath(file_path)
+
+        with self.__lock:
+            cached = self.__hashes.get(path)
+        if cached is None:
+            cached = self.__load(path)
+            if cached is not None:
+                with self.__lock:
+                    self.__hashes[path] = cached
+        if cached is not None and tuple(cached[:2]) == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+
+        hash = self.__hash_file(file_path)
+        cached = (stat.st_size, stat.st_mtime_ns, hash)
+        with self.__lock:
+            self.__num_hashes += 1
+            self.__hashes[path] = cached
+        self.__store(path, cached)
+        return hash
+
+    def __connect(self):
+        connection = sqlite3.connect(self.__file_path, timeout=config.HASH_CACHE_TIMEOUT)
+        connection.execute('CREATE TABLE IF NOT EXISTS hashes ('
+                           'path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, hash TEXT)')
+        return connection
+
+    def __load(self, path):
+        if self.__file_path is None:
+            return None
+        try:
+            with contextlib.closing(self.__connect()) as connection:
+                return connection.execute('SELECT size, mtime, hash FROM hashes WHERE path = ?',
+                                          (path,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f'Unable to read the hash cache {self.__file_path} exception={type(e).__name__}')
+            return None
+
+    def __store(self, path, cached):
+        if self.__file_path is None:
+            return
+        try:
+            with contextlib.closing(self.__connect()) as connection, connection:
+                connection.execute('INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?)', (path,) + cached)
+        except sqlite3.Error as e:
+            logger.warning(f'Unable to write the hash cache {self.__file_path} exception={type(e).__name__}')
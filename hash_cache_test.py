@@ -0,0 +1,46 @@
+from unittest.mock import Mock
+
+from hash_cache import HashCache
+
+
+def write_file(file_path, byte_data):
+    with open(file_path, 'wb') as file:
+        file.write(byte_data)
+
+
+def test_file_hash_once(tmp_path):
+    file_path = str(tmp_path / 'shard.mp4')
+    write_file(file_path, b'beef')
+    hash_file = Mock(return_value='0123456789abcdef')
+    cache = HashCache(hash_file)
+    assert cache.file_hash(file_path) == '0123456789abcdef'
+    assert cache.file_hash(file_path) == '0123456789abcdef'
+    hash_file.assert_called_once_with(file_path)
+    assert cache.num_hashes() == 1
+
+
+def test_file_hash_changed_file(tmp_path):
+    file_path = str(tmp_path / 'shard.mp4')
+    write_file(file_path, b'beef')
+    hash_file = Mock(side_effect=['0123456789abcdef', 'fedcba9876543210'])
+    cache = HashCache(hash_file)
+    cache.file_hash(file_path)
+    write_file(file_path, b'beefbeef')
+    assert cache.file_hash(file_path) == 'fedcba9876543210'
+
+
+def test_file_hash_shared_file(tmp_path):
+    file_path = str(tmp_path / 'shard.mp4')
+    write_file(file_path, b'beef')
+    db_file_path = str(tmp_path / 'hashes.sqlite')
+    hash_file = Mock(return_value='0123456789abcdef')
+    HashCache(hash_file, db_file_path).file_hash(file_path)
+    # a new cache (the next startup) reads the hash from the file
+    assert HashCache(hash_file, db_file_path).file_hash(file_path) == '0123456789abcdef'
+    hash_file.assert_called_once()
+
+
+def test_file_hash_missing_file(tmp_path):
+    hash_file = Mock(return_value=None)
+    HashCache(hash_file).file_hash(str(tmp_path / 'missing.mp4'))
+    hash_file.assert_called_once()
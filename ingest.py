@@ -0,0 +1,146 @@
+import argparse
+import os
+import threading
+import time
+import urllib.request
+
+import config
+import ingest_cache
+import sharder
+import video
+import youtube
+from config import logger
+
+
+def feed(url, process, source_file_path):
+    '''
+    Download url in order, writing every chunk both into the segmenter's
+    stdin and into the source file, then end the segmenter's input
+    '''
+    try:
+        with urllib.request.urlopen(url, timeout=config.DOWNLOAD_TIMEOUT) as response, \
+                open(source_file_path, 'wb') as file:
+            while True:
+                chunk = response.read(config.DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                file.write(chunk)
+                process.stdin.write(chunk)
+    finally:
+        process.stdin.close()
+
+
+def ingest(url, source_file_path, duration, num_shards, on_shard=None):
+    '''
+    Download a video and shard it at the same time
+
+    The download is piped into one ffmpeg segmenter (see video.open_segmenter)
+    cutting at the evenly spaced split points with stream copy, so each
+    shard starts on the first keyframe after its split point. Every shard is
+    hashed and added to the shards json file as soon as ffmpeg finishes it,
+    so fans can serve the first shards while the rest is still downloading.
+
+    Args:
+        url: The video stream to download
+        source_file_path: Where the downloaded video is written as well
+        duration: Length of the video in seconds
+        num_shards: Number of shards
+        on_shard: Called with every shard record as soon as it's written
+
+    Returns:
+        list: The shard records written to the manifest
+    '''
+    if not os.path.exists(config.SHARDS_DIR):
+        os.makedirs(config.SHARDS_DIR)
+    times = [start for start, end in sharder.plan_even(duration, num_shards)[1:]]
+
+    start_time = time.time()
+    process = video.open_segmenter(config.SHARDS_DIR + '/shard_%04d.mp4', times, copy=True)
+    errors = []
+
+    def download():
+        try:
+            feed(url, process, source_file_path)
+        except BaseException as e:
+            # e.g. a dropped connection, or ffmpeg exiting early (BrokenPipeError)
+            errors.append(e)
+
+    downloader = threading.Thread(target=download, name='ingest-download', daemon=True)
+    downloader.start()
+
+    # ffmpeg lists every shard as "file,start,end" once it's complete
+    records = []
+    for line in process.stdout:
+        file_name, start, end = line.decode().strip().split(',')
+        file_path = sharder.shard_file_path(len(records))
+        if os.path.basename(file_path) != file_name:
+            process.kill()
+            raise ValueError(f'segmenter wrote {file_name}, expected {os.path.basename(file_path)}')
+        record = {
+            'id': len(records),
+            'start': float(start),
+            'end': float(end),
+            'file_path': file_path,
+            'hash': video.file_hash(file_path)
+        }
+        records.append(record)
+        sharder.write_manifest(config.SHARDS_JSON_FILE_PATH, records)
+        if len(records) == 1:
+            logger.info(f'first shard ready after {time.time() - start_time:.2f} seconds')
+        if on_shard is not None:
+            on_shard(record)
+
+    downloader.join()
+    if errors:
+        process.kill()
+        raise errors[0]
+    if process.wait() != 0:
+        raise IOError(f'segmenter exited with {process.returncode}')
+    if len(records) != num_shards:
+        # split points closer together than the keyframes
+        logger.warning(f'WARNING: ingest wrote {len(records)} shards, expected {num_shards}')
+    logger.info(f'ingested {url} into {len(records)} shards in {time.time() - start_time:.2f} seconds')
+    return records
+
+
+def ingest_video(d_video, video_dir, file_name, num_shards, on_shard=None):
+    '''
+    Download and shard a youtube stream (see youtube.get_video) in one pass,
+    the download goes into the ingest cache like youtube.write_video's
+
+    A download already in the cache (or a stream of unknown length) is
+    downloaded first and sharded from disk instead
+    '''
+    file_path = os.path.join(video_dir, file_name)
+    media_file_path = ingest_cache.get_media(d_video)
+    if media_file_path is None and d_video.length is not None:
+        if config.INGEST_OFFLINE:
+            raise FileNotFoundError(ingest_cache.media_path(d_video.video_id, d_video.itag))
+        media_file_path = ingest_cache.media_path(d_video.video_id, d_video.itag)
+        os.makedirs(config.INGEST_CACHE_DIR, exist_ok=True)
+        records = ingest(d_video.url, media_file_path, d_video.length, num_shards, on_shard)
+        ingest_cache.put_media(d_video, media_file_path)
+        ingest_cache.copy_media(media_file_path, file_path)
+        return records
+
+    youtube.write_video(d_video, video_dir, file_name)
+    records = sharder.shard_video(file_path, num_shards)
+    if on_shard is not None:
+        for record in records:
+            on_shard(record)
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Download a youtube video and shard it while it downloads')
+    parser.add_argument('--url', default=config.URL)
+    parser.add_argument('--shards', type=int, default=config.NUM_SHARDS)
+    args = parser.parse_args()
+    d_video = youtube.get_video(youtube.download(args.url))
+    ingest_video(d_video, os.path.dirname(config.SOURCE_VIDEO_FILE_PATH),
+                 os.path.basename(config.SOURCE_VIDEO_FILE_PATH), args.shards)
+
+
+# Main should only execute for the main process
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import time
+
+import config
+import video
+from config import logger
+
+
+class CachedStream(object):
+    '''
+    The fields of a pytubefix stream that ingest needs, as kept in the cache
+    (stands in for the stream, see youtube.get_video)
+    '''
+
+    def __init__(self, video_id, itag, resolution, url, filesize, default_filename, time, length=None):
+        self.video_id = video_id
+        self.itag = itag
+        self.resolution = resolution
+        self.url = url
+        self.filesize = filesize
+        self.default_filename = default_filename
+        self.time = time  # when the stream was resolved
+        self.length = length  # of the video in seconds
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+class CachedVideo(object):
+    '''A video whose stream is in the cache (stands in for pytubefix.YouTube, see youtube.download)'''
+
+    def __init__(self, stream):
+        self.video_id = stream.video_id
+        self.stream = stream
+
+
+def stream_path(video_id):
+    '''Get the path of the cached stream metadata of a video'''
+    return os.path.join(config.INGEST_CACHE_DIR, video_id + '.json')
+
+
+def media_path(video_id, itag):
+    '''Get the path of a cached download'''
+    return os.path.join(config.INGEST_CACHE_DIR, f'{video_id}_{itag}.mp4')
+
+
+def get_stream(video_id, ttl=None):
+    '''
+    Get the cached stream of a video
+
+    Args:
+        video_id: The youtube video id
+        ttl: Seconds the stream stays fresh, defaults to INGEST_CACHE_TTL
+             (stream urls expire), None in offline mode
+
+    Returns:
+        CachedStream: the stream, or None if it isn't cached or is stale
+    '''
+    if ttl is None and not config.INGEST_OFFLINE:
+        ttl = config.INGEST_CACHE_TTL
+    try:
+        with open(stream_path(video_id)) as file:
+            stream = CachedStream(**json.load(file))
+    except (OSError, ValueError, TypeError):
+        return None
+    if ttl is not None and time.time() - stream.time > ttl:
+        logger.info(f'cached stream of {video_id} is stale')
+        return None
+    return stream
+
+
+def put_stream(video_id, d_video, length=None):
+    '''
+    Cache the stream chosen for a video (a pytubefix stream) and the length
+    of the video in seconds
+
+    Returns:
+        CachedStream: the cached stream
+    '''
+    stream = CachedStream(video_id, d_video.itag, d_video.resolution, d_video.url,
+                          d_video.filesize, d_video.default_filename, time.time(), length)
+    os.makedirs(config.INGEST_CACHE_DIR, exist_ok=True)
+    temp_file_path = stream_path(video_id) + '.tmp'
+    with open(temp_file_path, 'w') as file:
+        json.dump(stream.to_dict(), file, indent=4)
+    os.replace(temp_file_path, stream_path(video_id))
+    return stream
+
+
+def get_media(stream):
+    '''
+    Get the cached download of a stream, checked against its checksum
+
+    Returns:
+        str: path of the cached file, or None if it isn't cached or doesn't match
+    '''
+    file_path = media_path(stream.video_id, stream.itag)
+    try:
+        with open(file_path + '.json') as file:
+            checksum = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if not os.path.exists(file_path) or os.path.getsize(file_path) != checksum['size'] or \
+            video.file_hash(file_path) != checksum['hash']:
+        logger.warning(f'cached download {file_path} does not match its checksum')
+        return None
+    return file_path
+
+
+def put_media(stream, file_path):
+    '''Record the checksum of a finished download of a stream (written to media_path)'''
+    checksum = {'size': os.path.getsize(file_path), 'hash': video.file_hash(file_path)}
+    with open(file_path + '.json', 'w') as file:
+        json.dump(checksum, file)
+
+
+def copy_media(file_path, dst_file_path):
+    '''Write a cached download to dst_file_path, as a hard link where possible'''
+    if os.path.exists(dst_file_path):
+        if os.path.samefile(file_path, dst_file_path):
+            return
+        os.remove(dst_file_path)
+    try:
+        os.link(file_path, dst_file_path)
+    except OSError:
+        shutil.copyfile(file_path, dst_file_path)
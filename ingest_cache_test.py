@@ -0,0 +1,81 @@
+import time
+from unittest.mock import patch
+
+import ingest_cache
+import pytest
+import video
+import youtube
+from hash_cache import HashCache
+
+
+class Stream:
+    itag = 22
+    resolution = '720p'
+    url = 'https://example.com/video.mp4'
+    filesize = 4
+    default_filename = 'Video.mp4'
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path):
+    with patch('config.INGEST_CACHE_DIR', str(tmp_path / 'ingest_cache')), \
+            patch('video.hash_cache', HashCache(video.read_file_hash)):
+        yield tmp_path
+
+
+def test_stream():
+    assert ingest_cache.get_stream('abc') is None
+    ingest_cache.put_stream('abc', Stream())
+    stream = ingest_cache.get_stream('abc')
+    assert stream.itag == 22
+    assert stream.url == Stream.url
+    # stream urls expire
+    with patch('time.time', return_value=time.time() + 7 * 60 * 60):
+        assert ingest_cache.get_stream('abc') is None
+        with patch('config.INGEST_OFFLINE', True):
+            assert ingest_cache.get_stream('abc') is not None
+
+
+def test_media(cache_dir):
+    stream = ingest_cache.put_stream('abc', Stream())
+    assert ingest_cache.get_media(stream) is None
+    file_path = ingest_cache.media_path('abc', 22)
+    with open(file_path, 'wb') as file:
+        file.write(b'beef')
+    ingest_cache.put_media(stream, file_path)
+    assert ingest_cache.get_media(stream) == file_path
+
+    ingest_cache.copy_media(file_path, str(cache_dir / 'video.mp4'))
+    assert (cache_dir / 'video.mp4').read_bytes() == b'beef'
+
+    # a damaged download isn't served
+    with open(file_path, 'wb') as file:
+        file.write(b'dead')
+    assert ingest_cache.get_media(stream) is None
+
+
+def test_youtube_cached(cache_dir):
+    url = 'https://www.youtube.com/watch?v=WU4UxWaf8U8'
+    ingest_cache.put_stream('WU4UxWaf8U8', Stream())
+    with patch('pytubefix.YouTube') as yt:
+        d_video = youtube.get_video(youtube.download(url))
+    yt.assert_not_called()
+    assert d_video.itag == 22
+
+    def download(url, file_path, size):
+        with open(file_path, 'wb') as file:
+            file.write(b'beef')
+
+    with patch('downloader.download', side_effect=download) as downloader:
+        youtube.write_video(d_video, str(cache_dir), 'first.mp4')
+        youtube.write_video(d_video, str(cache_dir), 'second.mp4')
+    # the second run skips the network
+    downloader.assert_called_once()
+    assert (cache_dir / 'second.mp4').read_bytes() == b'beef'
+
+
+def test_youtube_offline(cache_dir):
+    with patch('config.INGEST_OFFLINE', True), patch('pytubefix.YouTube') as yt:
+        with pytest.raises(FileNotFoundError):
+            youtube.download('https://www.youtube.com/watch?v=WU4UxWaf8U8')
+    yt.assert_not_called()
@@ -0,0 +1,78 @@
+import http.server
+import json
+import subprocess
+import sys
+import threading
+from unittest.mock import patch
+
+import pytest
+
+import ingest
+import video
+from hash_cache import HashCache
+
+DATA = bytes(range(256)) * 40  # 10240 bytes
+
+# Stands in for the ffmpeg segmenter - every 2560 bytes read from stdin
+# become a shard, listed on stdout as soon as it's written
+SEGMENTER = '''
+import sys
+pattern = sys.argv[1]
+i = 0
+while True:
+    data = sys.stdin.buffer.read(2560)
+    if not data:
+        break
+    with open(pattern % i, 'wb') as file:
+        file.write(data)
+    print(f'{(pattern % i).rsplit("/", 1)[-1]},{i * 2.5:.6f},{(i + 1) * 2.5:.6f}', flush=True)
+    i += 1
+'''
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(DATA)))
+        self.end_headers()
+        self.wfile.write(DATA)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}/video.mp4'
+    server.shutdown()
+    server.server_close()
+
+
+def open_segmenter(output_file_pattern, times, copy=False):
+    return subprocess.Popen([sys.executable, '-c', SEGMENTER, output_file_pattern],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+
+def test_ingest(url, tmp_path):
+    json_file_path = str(tmp_path / 'shards.json')
+    ready = []
+    with patch('config.SHARDS_DIR', str(tmp_path / 'shards')), \
+            patch('config.SHARDS_JSON_FILE_PATH', json_file_path), \
+            patch('video.hash_cache', HashCache(video.read_file_hash)), \
+            patch('video.open_segmenter', side_effect=open_segmenter) as segmenter:
+        records = ingest.ingest(url, str(tmp_path / 'source.mp4'), 10.0, 4, ready.append)
+
+    assert segmenter.call_args[0][1] == [2.5, 5.0, 7.5]
+    assert (tmp_path / 'source.mp4').read_bytes() == DATA
+    assert ready == records
+    assert [record['end'] for record in records] == [2.5, 5.0, 7.5, 10.0]
+    with open(json_file_path) as file:
+        assert json.load(file) == records
+    for i, record in enumerate(records):
+        assert record['hash'] == video.read_file_hash(record['file_path'])
+        with open(record['file_path'], 'rb') as file:
+            assert file.read() == DATA[i * 2560:(i + 1) * 2560]
@@ -1,9 +1,13 @@
 import multiprocessing
+import os
 import time
 
 import config
 import fan
-import shared_buffer as sb
+import fan_runner
+import scheduler
+import shard
+import transport as tr
 import video
 import video_jockey
 from config import logger
@@ -50,8 +54,12 @@ def main():
     logger.info('=' * 80)
     logger.info(f'Configuration:')
     logger.info(f'  - Total shards: {config.NUM_SHARDS}')
-    logger.info(f'  - Fan processes: {config.NUM_FANS}')
+    logger.info(f'  - Fans: {config.NUM_FANS}')
+    logger.info(f'  - Fan runtime: {config.FAN_RUNTIME}')
+    logger.info(f'  - Scheduler: {config.SCHEDULER}')
+    logger.info(f'  - Delivery: {config.DELIVERY}')
     logger.info(f'  - Shared buffer size: {config.SHARED_BUFFER_SIZE}')
+    logger.info(f'  - Transport: {config.TRANSPORT}')
     logger.info(f'  - Fan buffer size: {config.FAN_BUFFER_SIZE}')
     logger.info('=' * 80)
 
@@ -59,12 +67,13 @@ def main():
     logger.info('Cleaning temporary directory...')
     video.clean_temp_directory()
 
-    # Create a manager to share data between processes
-    manager = multiprocessing.Manager()
-
-    # Create the shared buffer (4 slots with locks)
-    shared_buffer = sb.SharedBuffer(manager)
-    logger.info('Shared buffer created')
+    # Create the fan -> VJ transport
+    manager = None
+    if config.TRANSPORT == 'manager':
+        # Create a manager to share data between processes
+        manager = multiprocessing.Manager()
+    transport = tr.create_transport(config.TRANSPORT, config.NUM_FANS, manager)
+    logger.info(f'Transport created ({config.TRANSPORT})')
 
     # Distribute shards among fans
     fan_shard_assignments = distribute_shards_to_fans(config.NUM_SHARDS, config.NUM_FANS)
@@ -74,28 +83,44 @@ def main():
         logger.info(f'  Fan {i}: {len(shard_list)} shards (IDs {min(shard_list)}-{max(shard_list)})')
     logger.info('')
 
+    # Load the shards json file, the shard files are verified in the background
+    manifest = None
+    if os.path.exists(config.SHARDS_JSON_FILE_PATH):
+        manifest = shard.Manifest(config.SHARDS_JSON_FILE_PATH)
+        manifest.start_verify()
+        logger.info(f'Loaded {len(manifest)} shards from {config.SHARDS_JSON_FILE_PATH}')
+
     # Create the VJ (Marshmello) process
-    vj = video_jockey.VideoJockey()
+    vj = video_jockey.VideoJockey(manifest.ends() if manifest is not None else None)
     vj_process = multiprocessing.Process(
         target=vj.start,
-        args=([shared_buffer]),
+        args=([transport]),
         name='Marshmello-VJ'
     )
     
-    # Create all fan processes
-    fan_processes = []
-    for i in range(config.NUM_FANS):
-        # Create a fan with its assigned shard IDs
-        f = fan.Fan(i, fan_shard_assignments[i])
-        
-        # Create a process for this fan
-        fan_process = multiprocessing.Process(
-            target=f.start,
-            args=([shared_buffer]),
-            name=f'Fan-{i}'
-        )
-        
-        fan_processes.append(fan_process)
+    # Let idle fans steal shards from busy ones
+    shard_scheduler = None
+    if config.SCHEDULER == 'stealing':
+        shard_scheduler = scheduler.ShardScheduler(fan_shard_assignments)
+    
+    # Create all fans with their assigned shard IDs
+    fans = [fan.Fan(i, fan_shard_assignments[i], shard_scheduler) for i in range(config.NUM_FANS)]
+    
+    # Create the fan processes
+    if config.FAN_RUNTIME == 'asyncio':
+        # Host the fans as coroutines in a few worker processes
+        fan_processes = fan_runner.create_fan_workers(fans, transport, config.FAN_WORKERS)
+    else:
+        fan_processes = []
+        for i, f in enumerate(fans):
+            # Create a process for this fan (sending through its own endpoint)
+            fan_process = multiprocessing.Process(
+                target=f.start,
+                args=([transport.endpoint(i)]),
+                name=f'Fan-{i}'
+            )
+            
+            fan_processes.append(fan_process)
 
     # Start timing
     start_time = time.time()
@@ -129,6 +154,14 @@ def main():
     vj_process.join()
     logger.info('VJ process completed!')
 
+    # Release the transport
+    transport.close()
+
+    if manifest is not None:
+        corrupt_shard_ids = manifest.wait_verify()
+        if corrupt_shard_ids:
+            logger.error(f'File hash does not match for shards {corrupt_shard_ids}. Data is corrupted.')
+
     # Calculate elapsed time
     elapsed_time = time.time() - start_time
     
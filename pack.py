@@ -0,0 +1,89 @@
+import mmap
+import os
+import shutil
+import struct
+
+from config import logger
+
+# A pack file holds every shard back to back, then the index, then the footer
+#   index  - one entry per shard id: offset, length, hash (the 8 byte shake256 digest)
+#   footer - magic, number of shards, offset of the index
+MAGIC = b'CARTPAK1'
+INDEX_ENTRY = struct.Struct('<QQ8s')
+FOOTER = struct.Struct('<8sQQ')
+
+
+def write_pack(pack_file_path, file_paths, hashes):
+    '''
+    Write shard files into one pack file
+
+    Args:
+        pack_file_path: The pack file
+        file_paths: The shard files, by shard id
+        hashes: The hash of every shard file (see video.file_hash), by shard id
+    '''
+    index = []
+    temp_file_path = pack_file_path + '.tmp'
+    with open(temp_file_path, 'wb') as pack_file:
+        for file_path, hash in zip(file_paths, hashes):
+            offset = pack_file.tell()
+            with open(file_path, 'rb') as file:
+                shutil.copyfileobj(file, pack_file)
+            index.append(INDEX_ENTRY.pack(offset, pack_file.tell() - offset, bytes.fromhex(hash)))
+        index_offset = pack_file.tell()
+        pack_file.write(b''.join(index))
+        pack_file.write(FOOTER.pack(MAGIC, len(index), index_offset))
+    # readers never see a half written pack
+    os.replace(temp_file_path, pack_file_path)
+    logger.info(f'packed {len(index)} shards into {pack_file_path}')
+
+
+class Pack(object):
+    '''
+    Pack file class - the pack file is opened and memory-mapped once, and
+    every shard is a slice of the mapping found through the index
+    '''
+
+    def __init__(self, pack_file_path):
+        with open(pack_file_path, 'rb') as file:
+            self.__mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.__num_shards, self.__index_offset = FOOTER.unpack_from(
+            self.__mapping, len(self.__mapping) - FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError(f'{pack_file_path} is not a pack file')
+        self.__data = memoryview(self.__mapping)
+
+    def num_shards(self):
+        return self.__num_shards
+
+    def entry(self, shard_id):
+        '''
+        Get a shard's index entry
+
+        Returns:
+            tuple: (offset, length, hash)
+        '''
+        if not 0 <= shard_id < self.__num_shards:
+            raise KeyError(shard_id)
+        offset, length, digest = INDEX_ENTRY.unpack_from(
+            self.__mapping, self.__index_offset + shard_id * INDEX_ENTRY.size)
+        return (offset, length, digest.hex())
+
+    def shard(self, shard_id):
+        '''Get a shard's byte data, a memoryview over the mapping'''
+        offset, length, hash = self.entry(shard_id)
+        return self.__data[offset:offset + length]
+
+    def advise(self, shard_ids):
+        '''Ask the OS to start reading shards we'll need soon (no-op where madvise isn't available)'''
+        if not hasattr(self.__mapping, 'madvise'):
+            return
+        for shard_id in shard_ids:
+            try:
+                offset, length, hash = self.entry(shard_id)
+            except KeyError:
+                continue
+            # madvise needs a page aligned start
+            start = offset - offset % mmap.PAGESIZE
+            if length > 0:
+                self.__mapping.madvise(mmap.MADV_WILLNEED, start, offset + length - start)
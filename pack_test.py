@@ -0,0 +1,36 @@
+import pytest
+
+import pack
+
+
+def write_shards(tmp_path, num_shards):
+    file_paths = []
+    for i in range(num_shards):
+        file_path = tmp_path / f'shard_{i}.mp4'
+        # shards of different sizes, one of them empty
+        file_path.write_bytes(bytes([i]) * (i * 5000))
+        file_paths.append(str(file_path))
+    return file_paths
+
+
+def test_write_pack(tmp_path):
+    file_paths = write_shards(tmp_path, 4)
+    hashes = [f'{i:016x}' for i in range(4)]
+    pack_file_path = str(tmp_path / 'shards.pack')
+    pack.write_pack(pack_file_path, file_paths, hashes)
+
+    p = pack.Pack(pack_file_path)
+    assert p.num_shards() == 4
+    for i in range(4):
+        assert bytes(p.shard(i)) == bytes([i]) * (i * 5000)
+        assert p.entry(i)[2] == hashes[i]
+    p.advise([1, 2, 3])
+    with pytest.raises(KeyError):
+        p.shard(4)
+
+
+def test_not_a_pack(tmp_path):
+    file_path = tmp_path / 'shard_0.mp4'
+    file_path.write_bytes(bytes(64))
+    with pytest.raises(ValueError):
+        pack.Pack(str(file_path))
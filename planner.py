@@ -0,0 +1,91 @@
+import bisect
+import json
+import os
+
+import video
+from config import logger
+
+# the keyframe index is cached next to the source in this file
+KEYFRAME_INDEX_EXT = '.keyframes.json'
+
+
+def keyframe_index_path(source_file_path):
+    '''Get the path of the keyframe index cached for a source video'''
+    return source_file_path + KEYFRAME_INDEX_EXT
+
+
+def keyframe_index(source_file_path):
+    '''
+    Get the keyframe timestamps of a source video
+    The packet index is only read once, the keyframes are cached next to the
+    source and reused while the source's size and mtime stay the same
+
+    Returns:
+        list: Keyframe timestamps in seconds, in order
+    '''
+    stat = os.stat(source_file_path)
+    index_path = keyframe_index_path(source_file_path)
+    try:
+        with open(index_path) as file:
+            index = json.load(file)
+        if index['size'] == stat.st_size and index['mtime'] == stat.st_mtime:
+            return index['keyframes']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    logger.info(f'reading the keyframe index of {source_file_path}')
+    keyframes = video.keyframes(source_file_path)
+    index = {'size': stat.st_size, 'mtime': stat.st_mtime, 'keyframes': keyframes}
+    try:
+        with open(index_path, 'w') as file:
+            json.dump(index, file)
+    except OSError as e:
+        logger.warning(f'Unable to cache the keyframe index {index_path} exception={type(e).__name__}')
+    return keyframes
+
+
+def plan_keyframes(keyframes, duration, num_shards):
+    '''
+    Split a video into num_shards shards that all start on a keyframe, each
+    boundary on the keyframe nearest to where an even split would put it
+
+    Args:
+        keyframes: Keyframe timestamps in seconds, in order
+        duration: Length of the video in seconds
+        num_shards: Number of shards
+
+    Returns:
+        list: (start, end) in seconds for each shard
+
+    Raises:
+        ValueError: the video has fewer keyframes than shards
+    '''
+    # the first shard starts at 0, the rest start on a later keyframe
+    candidates = [t for t in keyframes if 0 < t < duration]
+    if len(candidates) < num_shards - 1:
+        logger.error(f'Unable to plan {num_shards} shards on {len(candidates) + 1} keyframes')
+        raise ValueError(f'not enough keyframes for {num_shards} shards')
+
+    starts = [0.0]
+    lo = 0
+    for i in range(1, num_shards):
+        # leave a keyframe for every shard still to come
+        hi = len(candidates) - (num_shards - 1 - i)
+        target = i * duration / num_shards
+        j = bisect.bisect_left(candidates, target, lo, hi)
+        if j == hi or (j > lo and target - candidates[j - 1] <= candidates[j] - target):
+            j -= 1
+        starts.append(candidates[j])
+        lo = j + 1
+
+    return [(start, end) for start, end in zip(starts, starts[1:] + [duration])]
+
+
+def plan(source_file_path, duration, num_shards):
+    '''
+    Plan keyframe-aligned shard boundaries for a source video
+
+    Returns:
+        list: (start, end) in seconds for each shard
+    '''
+    return plan_keyframes(keyframe_index(source_file_path), duration, num_shards)
@@ -0,0 +1,33 @@
+import os
+from unittest.mock import patch
+
+import planner
+import pytest
+
+
+def test_plan_keyframes():
+    keyframes = [0.0, 2.0, 4.0, 6.0, 8.0]
+    assert planner.plan_keyframes(keyframes, 11.0, 2) == [(0.0, 6.0), (6.0, 11.0)]
+    assert planner.plan_keyframes(keyframes, 10.0, 3) == [(0.0, 4.0), (4.0, 6.0), (6.0, 10.0)]
+
+
+def test_plan_keyframes_crowded():
+    # every shard still gets its own keyframe
+    assert planner.plan_keyframes([0.0, 9.0, 9.5], 10.0, 3) == [(0.0, 9.0), (9.0, 9.5), (9.5, 10.0)]
+
+
+def test_plan_keyframes_too_few():
+    with pytest.raises(ValueError):
+        planner.plan_keyframes([0.0, 5.0], 10.0, 3)
+
+
+def test_keyframe_index(tmp_path):
+    source_file_path = str(tmp_path / 'source.mp4')
+    with open(source_file_path, 'wb') as file:
+        file.write(b'beef')
+    with patch('video.keyframes', return_value=[0.0, 2.0]) as keyframes:
+        assert planner.keyframe_index(source_file_path) == [0.0, 2.0]
+        assert planner.keyframe_index(source_file_path) == [0.0, 2.0]
+    # read once, then served from the cache next to the source
+    keyframes.assert_called_once()
+    assert os.path.exists(planner.keyframe_index_path(source_file_path))
@@ -0,0 +1,107 @@
+import collections
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+
+import config
+import ffmpeg
+from config import logger
+
+
+class ProbeCache(object):
+    '''
+    ffprobe cache class - runs ffprobe at most once per file
+
+    Probes are keyed by the file's absolute path, size and mtime (and the
+    ffprobe arguments), so a file that is rewritten is probed again. Recent
+    probes are kept in an in-process LRU, and optionally in an SQLite file
+    that every process reading the same files shares.
+    '''
+
+    def __init__(self, size=None, file_path=None):
+        '''
+        Args:
+            size: Number of probes kept in memory, defaults to PROBE_CACHE_SIZE
+            file_path: The SQLite file, defaults to PROBE_CACHE_FILE_PATH
+                       (None keeps the probes in memory only)
+        '''
+        self.__size = config.PROBE_CACHE_SIZE if size is None else size
+        self.__file_path = file_path
+        self.__probes = collections.OrderedDict()  # key -> probe, least recently used first
+        self.__lock = threading.Lock()
+        self.__num_probes = 0  # ffprobe runs, for tests and benchmarks
+
+    def num_probes(self):
+        return self.__num_probes
+
+    def probe(self, video_file_path, **kwargs):
+        '''
+        Get the ffprobe output of a file (see ffmpeg.probe)
+
+        Args:
+            video_file_path: The file to probe
+            kwargs: Extra ffprobe arguments, e.g. show_entries
+        '''
+        stat = os.stat(video_file_path)
+        path = os.path.abspath(video_file_path)
+        args = json.dumps(kwargs, sort_keys=True)
+        key = (path, stat.st_size, stat.st_mtime_ns, args)
+
+        with self.__lock:
+            probe = self.__probes.get(key)
+            if probe is not None:
+                self.__probes.move_to_end(key)
+                return probe
+
+        probe = self.__load(key)
+        if probe is None:
+            probe = ffmpeg.probe(video_file_path, **kwargs)
+            self.__num_probes += 1
+            self.__store(key, probe)
+
+        with self.__lock:
+            self.__probes[key] = probe
+            while len(self.__probes) > self.__size:
+                self.__probes.popitem(last=False)
+        return probe
+
+    def clear(self):
+        '''Forget the probes kept in memory (the SQLite file is kept)'''
+        with self.__lock:
+            self.__probes.clear()
+
+    def __connect(self):
+        connection = sqlite3.connect(self.__file_path, timeout=config.PROBE_CACHE_TIMEOUT)
+        connection.execute('CREATE TABLE IF NOT EXISTS probes ('
+                           'path TEXT, args TEXT, size INTEGER, mtime INTEGER, probe TEXT, '
+                           'PRIMARY KEY (path, args))')
+        return connection
+
+    def __load(self, key):
+        if self.__file_path is None:
+            return None
+        path, size, mtime, args = key
+        try:
+            with contextlib.closing(self.__connect()) as connection:
+                row = connection.execute('SELECT size, mtime, probe FROM probes WHERE path = ? AND args = ?',
+                                         (path, args)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f'Unable to read the probe cache {self.__file_path} exception={type(e).__name__}')
+            return None
+
+        if row is None or row[0] != size or row[1] != mtime:
+            return None
+        return json.loads(row[2])
+
+    def __store(self, key, probe):
+        if self.__file_path is None:
+            return
+        path, size, mtime, args = key
+        try:
+            with contextlib.closing(self.__connect()) as connection, connection:
+                connection.execute('INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?)',
+                                   (path, args, size, mtime, json.dumps(probe)))
+        except sqlite3.Error as e:
+            logger.warning(f'Unable to write the probe cache {self.__file_path} exception={type(e).__name__}')
@@ -0,0 +1,69 @@
+import os
+from unittest.mock import patch
+
+from probe_cache import ProbeCache
+
+PROBE = {'streams': [{'codec_type': 'video', 'width': 640, 'height': 360}], 'format': {'duration': '2.0'}}
+
+
+def write_file(file_path, byte_data):
+    with open(file_path, 'wb') as file:
+        file.write(byte_data)
+
+
+def test_probe_once(tmp_path):
+    file_path = str(tmp_path / 'shard.mp4')
+    write_file(file_path, b'beef')
+    cache = ProbeCache(size=4)
+    with patch('ffmpeg.probe', return_value=PROBE) as probe:
+        assert cache.probe(file_path) == PROBE
+        assert cache.probe(file_path) == PROBE
+        # different arguments are a different probe
+        cache.probe(file_path, select_streams='v:0')
+    assert probe.call_count == 2
+    assert cache.num_probes() == 2
+
+
+def test_probe_changed_file(tmp_path):
+    file_path = str(tmp_path / 'shard.mp4')
+    write_file(file_path, b'beef')
+    cache = ProbeCache(size=4)
+    with patch('ffmpeg.probe', return_value=PROBE) as probe:
+        cache.probe(file_path)
+        write_file(file_path, b'beefbeef')
+        cache.probe(file_path)
+    assert probe.call_count == 2
+
+
+def test_probe_lru(tmp_path):
+    file_paths = [str(tmp_path / f'shard_{i}.mp4') for i in range(3)]
+    for file_path in file_paths:
+        write_file(file_path, b'beef')
+    cache = ProbeCache(size=2)
+    with patch('ffmpeg.probe', return_value=PROBE) as probe:
+        for file_path in file_paths:
+            cache.probe(file_path)
+        # the first file was evicted, the last one is still cached
+        cache.probe(file_paths[2])
+        cache.probe(file_paths[0])
+    assert probe.call_count == 4
+
+
+def test_probe_shared_file(tmp_path):
+    file_path = str(tmp_path / 'shard.mp4')
+    write_file(file_path, b'beef')
+    db_file_path = str(tmp_path / 'probe_cache.sqlite')
+    with patch('ffmpeg.probe', return_value=PROBE) as probe:
+        ProbeCache(file_path=db_file_path).probe(file_path)
+        # a new cache (another process) reads the probe from the file
+        assert ProbeCache(file_path=db_file_path).probe(file_path) == PROBE
+    probe.assert_called_once()
+    assert os.path.exists(db_file_path)
+
+
+def test_probe_unwritable_file(tmp_path):
+    file_path = str(tmp_path / 'shard.mp4')
+    write_file(file_path, b'beef')
+    cache = ProbeCache(file_path=str(tmp_path / 'missing' / 'probe_cache.sqlite'))
+    with patch('ffmpeg.probe', return_value=PROBE):
+        assert cache.probe(file_path) == PROBE
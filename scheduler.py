@@ -0,0 +1,94 @@
+import multiprocessing
+
+from config import logger
+
+
+class ShardScheduler(object):
+    '''
+    Shard scheduler class - hands shard IDs to fans on demand (work stealing)
+
+    Every fan starts with its own queue of shard IDs (its static assignment)
+    and takes shards from the front of it one at a time. A fan whose queue is
+    empty steals from the back of the longest queue, so a slow fan's shards
+    are picked up by the idle fans instead of holding up the VJ.
+
+    All the queues live back to back in one shared array. Fan i's queue is
+    ids[head[i]:tail[i]], the owner advances head and thieves pull tail back,
+    each under that queue's lock.
+    '''
+
+    def __init__(self, fan_shard_assignments):
+        '''
+        Initialize one queue per fan
+
+        Args:
+            fan_shard_assignments: List of shard ID lists, one per fan
+                                   (see main_example.distribute_shards_to_fans)
+        '''
+        self.__num_fans = len(fan_shard_assignments)
+        ids = []
+        heads = []
+        tails = []
+        for shard_ids in fan_shard_assignments:
+            heads.append(len(ids))
+            ids.extend(shard_ids)
+            tails.append(len(ids))
+
+        self.__ids = multiprocessing.Array('i', ids, lock=False)
+        self.__heads = multiprocessing.Array('i', heads, lock=False)
+        self.__tails = multiprocessing.Array('i', tails, lock=False)
+        self.__locks = [multiprocessing.Lock() for i in range(self.__num_fans)]
+
+    def num_fans(self):
+        return self.__num_fans
+
+    def size(self, i):
+        '''Get the number of shards left in fan i's queue'''
+        return max(self.__tails[i] - self.__heads[i], 0)
+
+    def peek(self, i, n):
+        '''
+        Get up to n shard IDs from the front of fan i's queue without taking them
+        A thief may still take them before fan i does
+        '''
+        with self.__locks[i]:
+            head = self.__heads[i]
+            return self.__ids[head:min(head + n, self.__tails[i])]
+
+    def next_shard(self, i):
+        '''
+        Take the next shard for fan i - from the front of its own queue, or
+        stolen from the back of the longest other queue once its own is empty
+
+        Returns:
+            int: the shard ID, or None once every queue is empty
+        '''
+        with self.__locks[i]:
+            head = self.__heads[i]
+            if head < self.__tails[i]:
+                self.__heads[i] = head + 1
+                return self.__ids[head]
+
+        return self.steal(i)
+
+    def steal(self, i):
+        '''
+        Take a shard from the back of the longest queue other than fan i's
+
+        Returns:
+            int: the shard ID, or None once every queue is empty
+        '''
+        while True:
+            # Sizes are read without the locks, the victim is re-checked below
+            victims = [j for j in range(self.__num_fans) if j != i and self.size(j) > 0]
+            if not victims:
+                return None
+            victim = max(victims, key=self.size)
+
+            with self.__locks[victim]:
+                tail = self.__tails[victim]
+                if self.__heads[victim] < tail:
+                    self.__tails[victim] = tail - 1
+                    shard_id = self.__ids[tail - 1]
+                    logger.debug(f'fan {i} stole shard {shard_id} from fan {victim}')
+                    return shard_id
@@ -0,0 +1,25 @@
+import scheduler
+
+
+def test_next_shard():
+    s = scheduler.ShardScheduler([[0, 1, 2], [3, 4]])
+    assert s.num_fans() == 2
+    assert s.peek(0, 2) == [0, 1]
+    assert s.next_shard(0) == 0
+    assert s.next_shard(0) == 1
+    assert s.size(0) == 1
+    assert s.next_shard(1) == 3
+
+
+def test_steal():
+    s = scheduler.ShardScheduler([[0, 1, 2, 3], [4], [5, 6]])
+    assert s.next_shard(1) == 4
+    # fan 1 is idle, it steals from the back of the longest queue
+    assert s.next_shard(1) == 3
+    assert s.next_shard(1) == 2
+    assert s.next_shard(1) == 1
+    assert s.next_shard(1) == 6
+    assert s.next_shard(0) == 0
+    assert s.next_shard(0) == 5
+    assert s.next_shard(0) is None
+    assert s.next_shard(2) is None
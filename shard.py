@@ -1,4 +1,6 @@
 import json
+import os
+import threading
 
 import video
 from config import logger
@@ -46,3 +48,126 @@ class Shard(object):
         }
         s = json.dumps(d, indent=4)
         return s
+
+
+class ShardRecord(object):
+    '''
+    Compact shard record - the fields of a Shard from the shards json file,
+    without hashing the shard file until verify is called
+    '''
+
+    __slots__ = ('__id', '__start', '__end', '__file_path', '__hash')
+
+    def __init__(self, id, start, end, file_path, hash):
+        self.__id = id
+        self.__start = start
+        self.__end = end
+        self.__file_path = file_path
+        self.__hash = hash
+
+    def id(self):
+        return self.__id
+
+    def start(self):
+        return self.__start
+
+    def end(self):
+        return self.__end
+
+    def file_path(self):
+        return self.__file_path
+
+    def hash(self):
+        return self.__hash
+
+    def verify(self):
+        '''Check the shard file still has the hash in the manifest'''
+        return video.file_hash(self.__file_path) == self.__hash
+
+
+class Manifest(object):
+    '''
+    Shards json file class - every shard as a ShardRecord, looked up by id
+
+    Loading only parses the json file, so it doesn't scale with the size of
+    the shards. The shard files are verified separately, either with verify
+    or in a background thread (start_verify, then wait_verify) while the
+    shards are already being streamed.
+    '''
+
+    def __init__(self, json_file_path):
+        with open(json_file_path) as file:
+            records = json.load(file)
+        self.__records = [None] * len(records)  # ShardRecord by shard id
+        for record in records:
+            self.__records[record['id']] = ShardRecord(**record)
+        self.__verifier = None
+        self.__corrupt_shard_ids = None
+
+    def __len__(self):
+        return len(self.__records)
+
+    def record(self, shard_id):
+        return self.__records[shard_id]
+
+    def ends(self):
+        '''Get the end time in seconds of every shard by shard id'''
+        return [record.end() for record in self.__records]
+
+    def verify(self, num_workers=None):
+        '''
+        Hash every shard file, num_workers at a time (see video.file_hashes)
+
+        Returns:
+            list: IDs of the shards whose hash doesn't match the manifest
+        '''
+        hashes = video.file_hashes([record.file_path() for record in self.__records], num_workers)
+        return [record.id() for record, hash in zip(self.__records, hashes) if hash != record.hash()]
+
+    def start_verify(self, num_workers=None):
+        '''Verify the shard files in a background thread'''
+        def verify():
+            self.__corrupt_shard_ids = self.verify(num_workers)
+
+        self.__verifier = threading.Thread(target=verify, name='Manifest-verify', daemon=True)
+        self.__verifier.start()
+
+    def wait_verify(self):
+        '''
+        Wait for the background verification to finish
+
+        Returns:
+            list: IDs of the shards whose hash doesn't match the manifest
+        '''
+        self.__verifier.join()
+        if self.__corrupt_shard_ids is None:
+            raise Exception('shard verification did not finish')
+        return self.__corrupt_shard_ids
+
+
+def load_shard_ends(json_file_path):
+    '''
+    Read the end time of every shard from a shards json file (a list of
+    objects with the Shard fields), without hashing the shard files
+
+    Returns:
+        list: end time in seconds by shard id, or None if there's no file
+    '''
+    if not os.path.exists(json_file_path):
+        return None
+    return Manifest(json_file_path).ends()
+
+
+def load_shards(json_file_path, num_workers=None):
+    '''
+    Load every shard in a shards json file, hashing the shard files
+    num_workers at a time first (see video.file_hashes)
+
+    Returns:
+        list: Shard objects in id order
+    '''
+    with open(json_file_path) as file:
+        records = json.load(file)
+    records.sort(key=lambda record: record['id'])
+    video.file_hashes([record['file_path'] for record in records], num_workers)
+    return [Shard(**record) for record in records]
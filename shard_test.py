@@ -0,0 +1,50 @@
+import json
+from unittest.mock import patch
+
+import shard
+import video
+from hash_cache import HashCache
+
+
+def write_manifest(tmp_path, num_shards):
+    records = []
+    for i in range(num_shards):
+        file_path = str(tmp_path / f'shard_{i}.mp4')
+        with open(file_path, 'wb') as file:
+            file.write(bytes([i]) * 8)
+        records.append({'id': i, 'start': i * 2.0, 'end': (i + 1) * 2.0, 'file_path': file_path,
+                        'hash': video.read_file_hash(file_path)})
+    json_file_path = str(tmp_path / 'shards.json')
+    with open(json_file_path, 'w') as file:
+        # the records don't have to be in id order
+        json.dump(records[::-1], file)
+    return json_file_path
+
+
+def test_manifest(tmp_path):
+    json_file_path = write_manifest(tmp_path, 3)
+    with patch('video.file_hash') as file_hash:
+        manifest = shard.Manifest(json_file_path)
+    # loading doesn't touch the shard files
+    file_hash.assert_not_called()
+    assert len(manifest) == 3
+    assert manifest.record(1).start() == 2.0
+    assert manifest.ends() == [2.0, 4.0, 6.0]
+    assert shard.load_shard_ends(json_file_path) == [2.0, 4.0, 6.0]
+
+
+def test_shard_record_slots():
+    record = shard.ShardRecord(0, 0.0, 2.0, 'shard_0.mp4', '0123456789abcdef')
+    assert not hasattr(record, '__dict__')
+
+
+def test_manifest_verify(tmp_path):
+    json_file_path = write_manifest(tmp_path, 3)
+    manifest = shard.Manifest(json_file_path)
+    with open(manifest.record(2).file_path(), 'wb') as file:
+        file.write(b'corrupt')
+    with patch('video.hash_cache', HashCache(video.read_file_hash)):
+        assert manifest.verify(2) == [2]
+        manifest.start_verify(2)
+        assert manifest.wait_verify() == [2]
+        assert manifest.record(0).verify()
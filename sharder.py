@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+import pack
+import planner
+import video
+from store import ShardStore
+from config import logger
+
+
+def shard_file_path(shard_id):
+    '''Get the path of a shard file (the path fans read it from)'''
+    padded = str(shard_id).zfill(4)
+    return config.SHARDS_DIR + '/' + f'shard_{padded}.mp4'
+
+
+def plan_even(duration, num_shards):
+    '''
+    Split a video into evenly spaced shards
+
+    Args:
+        duration: Length of the video in seconds
+        num_shards: Number of shards
+
+    Returns:
+        list: (start, end) in seconds for each shard
+    '''
+    step = duration / num_shards
+    return [(i * step, duration if i == num_shards - 1 else (i + 1) * step) for i in range(num_shards)]
+
+
+def plan(source_file_path, duration, num_shards, boundaries=None):
+    '''
+    Plan the shard boundaries
+
+    Args:
+        boundaries: 'keyframe' - every shard starts on a keyframe (see planner),
+                                 falls back to 'even' if there aren't enough
+                    'even'     - evenly spaced
+                    defaults to SHARD_BOUNDARIES
+
+    Returns:
+        tuple: ((start, end) for each shard, True if they're keyframe aligned)
+    '''
+    if boundaries is None:
+        boundaries = config.SHARD_BOUNDARIES
+    if boundaries == 'keyframe':
+        try:
+            return (planner.plan(source_file_path, duration, num_shards), True)
+        except ValueError:
+            logger.warning(f'falling back to evenly spaced shards for {source_file_path}')
+    return (plan_even(duration, num_shards), False)
+
+
+def write_shards(source_file_path, boundaries, mode, num_workers, copy=False, shard_ids=None):
+    '''
+    Cut the source video into shard files under SHARDS_DIR
+
+    Args:
+        source_file_path: The source video
+        boundaries: (start, end) in seconds for each shard
+        mode: 'segment' - one ffmpeg pass over the source with the segment muxer
+              'seek'    - one ffmpeg per shard seeking to its start, num_workers at a time
+        num_workers: Number of shards cut at once ('seek' only)
+        copy: Stream copy instead of re-encoding (every shard must start on a keyframe)
+        shard_ids: IDs of the shards to cut ('seek' only), defaults to all of them
+    '''
+    if not os.path.exists(config.SHARDS_DIR):
+        os.makedirs(config.SHARDS_DIR)
+
+    if mode == 'segment':
+        times = [start for start, end in boundaries[1:]]
+        video.segment(source_file_path, config.SHARDS_DIR + '/shard_%04d.mp4', times, copy)
+        return
+
+    # every task just waits on its own ffmpeg process, threads are enough
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        if shard_ids is None:
+            shard_ids = range(len(boundaries))
+        futures = [executor.submit(video.cut, source_file_path, shard_file_path(i), *boundaries[i], copy)
+                   for i in shard_ids]
+        for future in futures:
+            future.result()
+
+
+def recipe(source_hash, start, end, copy):
+    '''Get the store recipe of a shard - what it was cut from and how'''
+    return f'{source_hash} {start:.6f} {end:.6f} {"copy" if copy else "encode"}'
+
+
+def write_manifest(json_file_path, records):
+    '''
+    Write the shards json file - a list of objects with the shard.Shard fields
+    (id, start, end, file_path, hash)
+    '''
+    with open(json_file_path, 'w') as file:
+        json.dump(records, file, indent=4)
+
+
+def shard_video(source_file_path, num_shards, mode=None, num_workers=None, boundaries=None, pack_shards=None):
+    '''
+    Cut the source video into num_shards shard files and write the shards json file,
+    and the pack file if pack_shards is set
+    (mode, num_workers, boundaries and pack_shards default to SHARD_MODE, SHARD_WORKERS,
+    SHARD_BOUNDARIES and SHARD_PACK)
+
+    With SHARD_STORE_DIR set, shards already in the store (same source, start,
+    end and cut) are linked from it instead of cut again, the rest are cut
+    and added to it
+
+    Returns:
+        list: The shard records written to the manifest
+    '''
+    if mode is None:
+        mode = config.SHARD_MODE
+    if num_workers is None:
+        num_workers = config.SHARD_WORKERS
+    if pack_shards is None:
+        pack_shards = config.SHARD_PACK
+
+    duration = video.duration(source_file_path)
+    boundaries, copy = plan(source_file_path, duration, num_shards, boundaries)
+    logger.info(f'sharding {source_file_path} ({duration:.2f} seconds) into {num_shards} shards '
+                f'({mode}, {"stream copy" if copy else "re-encode"})')
+
+    file_paths = [shard_file_path(i) for i in range(num_shards)]
+    store = None
+    stored = {}  # shard id -> hash of the shards already in the store
+    if config.SHARD_STORE_DIR is not None:
+        store = ShardStore(config.SHARD_STORE_DIR)
+        source_hash = video.file_hash(source_file_path)
+        recipes = [recipe(source_hash, start, end, copy) for start, end in boundaries]
+        for i, key in enumerate(recipes):
+            hash = store.recipe(key)
+            if hash is not None:
+                stored[i] = hash
+    missing = [i for i in range(num_shards) if i not in stored]
+
+    # ffmpeg overwrites in place, which would write through a link into a blob
+    for i in missing:
+        if os.path.exists(file_paths[i]):
+            os.remove(file_paths[i])
+    if len(missing) == num_shards:
+        write_shards(source_file_path, boundaries, mode, num_workers, copy)
+    elif missing:
+        # only some shards are new, cut just those
+        logger.info(f'reusing {len(stored)} stored shards, cutting {len(missing)}')
+        write_shards(source_file_path, boundaries, 'seek', num_workers, copy, missing)
+    else:
+        logger.info(f'reusing all {num_shards} stored shards')
+    for i, hash in stored.items():
+        store.get(hash, file_paths[i])
+    for file_path in file_paths:
+        if not os.path.exists(file_path):
+            logger.error(f'ERROR: shard {file_path} was not written')
+            raise FileNotFoundError(file_path)
+    hashes = video.file_hashes(file_paths, num_workers)
+    if store is not None:
+        for i in missing:
+            store.put(file_paths[i], hashes[i])
+        store.set_recipes({recipes[i]: hashes[i] for i in missing})
+
+    records = []
+    for i, (start, end) in enumerate(boundaries):
+        records.append({
+            'id': i,
+            'start': start,
+            'end': end,
+            'file_path': file_paths[i],
+            'hash': hashes[i]
+        })
+    write_manifest(config.SHARDS_JSON_FILE_PATH, records)
+    if pack_shards:
+        pack.write_pack(config.SHARDS_PACK_FILE_PATH, file_paths, hashes)
+    logger.info(f'wrote {num_shards} shards and {config.SHARDS_JSON_FILE_PATH}')
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cut the source video into shards and write the shards json file')
+    parser.add_argument('--source', default=config.SOURCE_VIDEO_FILE_PATH)
+    parser.add_argument('--shards', type=int, default=config.NUM_SHARDS)
+    parser.add_argument('--mode', default=config.SHARD_MODE, choices=['segment', 'seek'])
+    parser.add_argument('--workers', type=int, default=config.SHARD_WORKERS)
+    parser.add_argument('--boundaries', default=config.SHARD_BOUNDARIES, choices=['keyframe', 'even'])
+    parser.add_argument('--pack', action='store_true', default=config.SHARD_PACK,
+                        help='also write the shards into one pack file')
+    args = parser.parse_args()
+    shard_video(args.source, args.shards, args.mode, args.workers, args.boundaries, args.pack)
+
+
+# Main should only execute for the main process
+if __name__ == '__main__':
+    main()
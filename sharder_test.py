@@ -0,0 +1,94 @@
+import json
+from unittest.mock import patch
+
+import pack
+import pytest
+import shard
+import sharder
+import video
+from hash_cache import HashCache
+
+
+def test_plan_even():
+    assert sharder.plan_even(10, 4) == [(0, 2.5), (2.5, 5.0), (5.0, 7.5), (7.5, 10)]
+
+
+def write_fake_shards(input_file_path, output_file_pattern, times, copy=False):
+    for i in range(len(times) + 1):
+        with open(output_file_pattern % i, 'wb') as file:
+            file.write(bytes([i]) * 8)
+
+
+def write_fake_cut(input_file_path, output_file_path, start, end, copy=False):
+    with open(output_file_path, 'wb') as file:
+        file.write(b'cut')
+
+
+def test_shard_video(tmp_path):
+    json_file_path = str(tmp_path / 'shards.json')
+    with patch('config.SHARDS_DIR', str(tmp_path)), \
+            patch('config.SHARDS_JSON_FILE_PATH', json_file_path), \
+            patch('video.duration', return_value=9.0), \
+            patch('video.segment', side_effect=write_fake_shards) as segment:
+        records = sharder.shard_video('source.mp4', 3, 'segment', boundaries='even')
+    assert segment.call_args[0][2:] == ([3.0, 6.0], False)
+    with open(json_file_path) as file:
+        assert json.load(file) == records
+    s = shard.Shard(**records[2])
+    assert s.start() == 6.0
+    assert s.end() == 9.0
+
+
+def test_shard_video_missing_shard(tmp_path):
+    with patch('config.SHARDS_DIR', str(tmp_path)), \
+            patch('video.duration', return_value=9.0), \
+            patch('video.cut'):
+        with pytest.raises(FileNotFoundError):
+            sharder.shard_video('source.mp4', 3, 'seek', boundaries='even')
+
+
+def test_plan_keyframe():
+    with patch('planner.keyframe_index', return_value=[0.0, 4.0, 8.0]):
+        assert sharder.plan('source.mp4', 9.0, 2, 'keyframe') == ([(0.0, 4.0), (4.0, 9.0)], True)
+        assert sharder.plan('source.mp4', 9.0, 4, 'keyframe') == (sharder.plan_even(9.0, 4), False)
+
+
+def test_shard_video_pack(tmp_path):
+    pack_file_path = str(tmp_path / 'shards.pack')
+    with patch('config.SHARDS_DIR', str(tmp_path)), \
+            patch('config.SHARDS_JSON_FILE_PATH', str(tmp_path / 'shards.json')), \
+            patch('config.SHARDS_PACK_FILE_PATH', pack_file_path), \
+            patch('video.duration', return_value=9.0), \
+            patch('video.segment', side_effect=write_fake_shards):
+        records = sharder.shard_video('source.mp4', 3, 'segment', boundaries='even', pack_shards=True)
+    p = pack.Pack(pack_file_path)
+    assert bytes(p.shard(2)) == bytes([2]) * 8
+    assert p.entry(2)[2] == records[2]['hash']
+
+
+def test_shard_video_store(tmp_path):
+    source_file_path = tmp_path / 'source.mp4'
+    source_file_path.write_bytes(b'source')
+    shards_dir = tmp_path / 'shards'
+    with patch('config.SHARDS_DIR', str(shards_dir)), \
+            patch('config.SHARDS_JSON_FILE_PATH', str(tmp_path / 'shards.json')), \
+            patch('config.SHARD_STORE_DIR', str(tmp_path / 'store')), \
+            patch('video.hash_cache', HashCache(video.read_file_hash)), \
+            patch('video.duration', return_value=9.0):
+        with patch('video.segment', side_effect=write_fake_shards) as segment:
+            records = sharder.shard_video(str(source_file_path), 3, 'segment', boundaries='even')
+        segment.assert_called_once()
+
+        # re-sharding the same source reuses every stored shard
+        (shards_dir / 'shard_0001.mp4').unlink()
+        with patch('video.segment') as segment, patch('video.cut') as cut:
+            assert sharder.shard_video(str(source_file_path), 3, 'segment', boundaries='even') == records
+        segment.assert_not_called()
+        cut.assert_not_called()
+        assert (shards_dir / 'shard_0001.mp4').read_bytes() == bytes([1]) * 8
+
+        # with a new tail only the new shards are cut
+        with patch('video.duration', return_value=12.0), \
+                patch('video.cut', side_effect=write_fake_cut) as cut:
+            sharder.shard_video(str(source_file_path), 4, 'segment', boundaries='even')
+        assert [call[0][2:4] for call in cut.call_args_list] == [(9.0, 12.0)]
@@ -1,8 +1,252 @@
+import multiprocessing
+import struct
+from multiprocessing import shared_memory
+
 import config
 from config import logger
 
+# slot states for the shared memory buffer
+SLOT_EMPTY = 0
+SLOT_FULL = 1
+
+# message flags
+LAST_CHUNK = 1  # the chunk ends its shard (a whole shard is a single last chunk)
+
+# shared memory slot header: (state, flags, shard_id, seq, length, sender_name)
+SLOT_HEADER = struct.Struct('<BBiII64s')
+
+# lane header: (head, tail) - shards written and shards read so far
+# the fan only ever writes the head and the vj only ever writes the tail
+LANE_HEADER = struct.Struct('<QQ')
+LANE_COUNTER = struct.Struct('<Q')
+
+
+def pack_slot(buf, offset, slot_size, sender_name, shard_id, byte_data, seq=0, flags=LAST_CHUNK):
+    '''
+    Copy a shard into the shared memory slot at offset
+    The payload is written first and the header last, so a reader that sees
+    a full header always sees the whole payload
+    '''
+    length = len(byte_data)
+    if length > slot_size:
+        logger.error(
+            f'Shard {shard_id} is {length} bytes, larger than the {slot_size} byte shared memory slot')
+        raise ValueError(f'shard {shard_id} does not fit in a shared memory slot')
+
+    start = offset + SLOT_HEADER.size
+    buf[start:start + length] = byte_data
+    SLOT_HEADER.pack_into(buf, offset, SLOT_FULL, flags, shard_id, seq, length,
+                          sender_name.encode('utf-8')[:64])
+
+
+def chunk_message(shard_id, byte_data, chunk_size):
+    '''
+    Split a whole shard into numbered chunks of at most chunk_size bytes
+    Only the last chunk is flagged LAST_CHUNK
+
+    Returns:
+        list: (shard_id, byte_data, seq, flags) for each chunk, byte_data is a
+              memoryview into the shard
+    '''
+    view = memoryview(byte_data)
+    num_chunks = max((len(view) + chunk_size - 1) // chunk_size, 1)
+    messages = []
+    for seq in range(num_chunks):
+        chunk = view[seq * chunk_size:(seq + 1) * chunk_size]
+        flags = LAST_CHUNK if seq == num_chunks - 1 else 0
+        messages.append((shard_id, chunk, seq, flags))
+    return messages
+
+
+def check_slot_size(slot_size, shard_id, byte_data, seq, flags):
+    '''
+    Check a message fits in a slot before a slot is reserved for it
+
+    Returns:
+        bool: True if it fits, False if it's a whole shard that has to be sent
+              in slot-sized chunks
+
+    Raises:
+        ValueError: it's a chunk or a batch, which can't be split any further
+    '''
+    if slot_size is None or len(byte_data) <= slot_size:
+        return True
+    if seq == 0 and flags == LAST_CHUNK:
+        return False
+    logger.error(
+        f'Message for shard {shard_id} is {len(byte_data)} bytes, larger than the {slot_size} byte shared memory slot')
+    raise ValueError(f'message for shard {shard_id} does not fit in a shared memory slot')
+
+
+def unpack_slot(buf, offset):
+    '''
+    Read the shared memory slot at offset
+
+    Returns:
+        tuple: (sender_name, shard_id, byte_data, seq, flags) where byte_data
+               is a memoryview into the slot, or None if the slot is empty
+    '''
+    state, flags, shard_id, seq, length, sender_name = SLOT_HEADER.unpack_from(buf, offset)
+    if state == SLOT_EMPTY:
+        return None
+    start = offset + SLOT_HEADER.size
+    sender_name = sender_name.rstrip(b'\0').decode('utf-8', 'ignore')
+    return (sender_name, shard_id, buf[start:start + length], seq, flags)
+
+
+class SlotBuffer(object):
+    '''
+    Slot buffer base class - blocking producer/consumer handoff over the slots
+
+    Subclasses own the slot storage and create two counting semaphores:
+    self.free (slots a fan may write into) and self.filled (slots the VJ may
+    read from). Fans sleep on free until a slot empties and the VJ sleeps on
+    filled until a slot fills, so neither side polls.
 
-class SharedBuffer(object):
+    Slot buffers implement the transport interface (see transport.Transport)
+    '''
+
+    def endpoint(self, i):
+        '''Get the object fan i sends through (every fan shares the slots)'''
+        return self
+
+    def done(self):
+        '''Signal to all fans that the VJ has all the shards'''
+        self.vj_has_all_shards.value = True
+
+    def is_done(self):
+        '''Check if the VJ has all the shards'''
+        return bool(self.vj_has_all_shards.value)
+
+    def set_watermark(self, shard_id):
+        '''Publish the lowest shard the VJ is still missing'''
+        self.vj_watermark.value = shard_id
+
+    def watermark(self):
+        '''Get the lowest shard the VJ is still missing'''
+        return self.vj_watermark.value
+
+    def close(self):
+        '''Release the slots (nothing to release by default)'''
+        pass
+
+    def slot_shard_ids(self):
+        '''
+        Get the shard ID in every slot (None for empty slots) without taking
+        the locks - only a hint for ordering, a slot can change right after
+        '''
+        return [self.shard_id(i) for i in range(config.SHARED_BUFFER_SIZE)]
+
+    def receive_order(self):
+        '''
+        Get the order the VJ checks the slots in - slot order, or lowest shard
+        ID first with DELIVERY 'edf'
+        '''
+        if config.DELIVERY != 'edf':
+            return range(config.SHARED_BUFFER_SIZE)
+        shard_ids = self.slot_shard_ids()
+        return sorted(range(config.SHARED_BUFFER_SIZE),
+                      key=lambda i: float('inf') if shard_ids[i] is None else shard_ids[i])
+
+    def slot_size(self):
+        '''Get the max number of bytes a slot can hold (None for no limit)'''
+        return None
+
+    def read_slot(self, i):
+        '''
+        Read buffer slot i in one step
+        Must be called while holding the lock for slot i
+
+        Returns:
+            tuple: (sender_name, shard_id, byte_data, seq, flags) or None if the slot is empty
+        '''
+        if self.is_slot_empty(i):
+            return None
+        return (self.sender_name(i), self.shard_id(i), self.byte_data(i), 0, LAST_CHUNK)
+
+    def send(self, sender_name, shard_id, byte_data, seq=0, flags=LAST_CHUNK):
+        '''
+        Write a shard (or one chunk of a shard) into an empty slot
+        Blocks until a slot becomes free or the VJ has all shards
+        A whole shard larger than a slot is sent as slot-sized chunks
+
+        Returns:
+            int: the (last) slot index written, or None if the VJ already has all shards
+        '''
+        if not check_slot_size(self.slot_size(), shard_id, byte_data, seq, flags):
+            for message in chunk_message(shard_id, byte_data, self.slot_size()):
+                slot_index = self.send(sender_name, *message)
+                if slot_index is None:
+                    return None
+            return slot_index
+
+        # Wait for a free slot (positional args for Python 3.13 compatibility)
+        while not self.free.acquire(True, config.SHARED_BUFFER_TIMEOUT):
+            if self.vj_has_all_shards.value:
+                return None
+
+        # A slot is reserved for us, find it. Other fans only hold a slot lock
+        # while checking or writing it, so this never waits on the VJ.
+        slot_index = shard_id % config.SHARED_BUFFER_SIZE
+        while True:
+            lock = self.lock(slot_index)
+            if lock.acquire(False):
+                try:
+                    if self.is_slot_empty(slot_index):
+                        self.write_to_slot(slot_index, sender_name, shard_id, byte_data, seq, flags)
+                        break
+                finally:
+                    lock.release()
+            slot_index = (slot_index + 1) % config.SHARED_BUFFER_SIZE
+
+        # Wake the VJ
+        self.filled.release()
+        return slot_index
+
+    def receive(self, timeout=None):
+        '''
+        Read a shard out of a full slot and free the slot
+        Blocks until a slot fills or the timeout expires
+
+        Args:
+            timeout: Seconds to wait for a full slot (None waits forever)
+
+        Returns:
+            tuple: (shard_id, byte_data, sender_name, seq, flags) or None on timeout
+        '''
+        if not self.filled.acquire(True, timeout):
+            return None
+
+        # At least one slot is full, the VJ is the only reader
+        for slot_index in self.receive_order():
+            lock = self.lock(slot_index)
+            lock.acquire()
+            try:
+                slot = self.read_slot(slot_index)
+                if slot is None:
+                    continue
+                sender_name, shard_id, byte_data, seq, flags = slot
+
+                # The shared memory backend hands out a view into the slot,
+                # copy it out before the slot is reused (no pickling either way)
+                if isinstance(byte_data, memoryview):
+                    byte_data = bytes(byte_data)
+
+                # Clear the slot (make it empty for fans to use)
+                self.clear_slot(slot_index)
+            finally:
+                lock.release()
+
+            # Wake a fan
+            self.free.release()
+            logger.debug(f'read shard {shard_id} from shared buffer slot {slot_index} (from {sender_name})')
+            return (shard_id, byte_data, sender_name, seq, flags)
+
+        logger.error('shared buffer signalled a full slot but none was found')
+        return None
+
+
+class SharedBuffer(SlotBuffer):
     '''
     Shared buffer class - holds up to 4 shards with locks for synchronization
     '''
@@ -14,17 +258,31 @@ class SharedBuffer(object):
         # a shared variable to indicate when the vj has all the shards
         self.vj_has_all_shards = manager.Value('has_all_shards', False)
 
-        # a shared buffer which is a list of (lock, sender_name, shard_id, byte_data)
+        # the lowest shard the vj is still missing
+        self.vj_watermark = manager.Value('i', 0)
+
+        # slots a fan may write into, and slots the vj may read from
+        self.free = manager.Semaphore(config.SHARED_BUFFER_SIZE)
+        self.filled = manager.Semaphore(0)
+
+        # a shared buffer which is a list of (lock, sender_name, shard_id, byte_data, seq, flags)
+        # the lock proxies are also kept locally so taking a lock doesn't
+        # fetch the whole slot (and its byte data) from the manager first
+        self.__locks = []
         self.__buffer = manager.list()
+        # the shard id in each slot, so the vj can order the slots with one
+        # round trip (only kept up to date with DELIVERY 'edf')
+        self.__shard_ids = manager.list([None] * config.SHARED_BUFFER_SIZE)
         for i in range(config.SHARED_BUFFER_SIZE):
             lock = manager.Lock()
+            self.__locks.append(lock)
             # Initially, each slot is empty (None values)
-            elem = (lock, None, None, None)
+            elem = (lock, None, None, None, 0, 0)
             self.__buffer.append(elem)
 
     def lock(self, i):
         '''Get the lock for buffer slot i'''
-        return self.__buffer[i][0]
+        return self.__locks[i]
 
     def sender_name(self, i):
         '''Get the sender name from buffer slot i'''
@@ -50,18 +308,352 @@ class SharedBuffer(object):
         '''Check if buffer slot i is full (has data)'''
         return self.__buffer[i][3] is not None
 
-    def write_to_slot(self, i, sender_name, shard_id, byte_data):
+    def read_slot(self, i):
+        '''
+        Read buffer slot i with a single manager round trip
+        Must be called while holding the lock for slot i
+        '''
+        lock, sender_name, shard_id, byte_data, seq, flags = self.__buffer[i]
+        if byte_data is None:
+            return None
+        return (sender_name, shard_id, byte_data, seq, flags)
+
+    def write_to_slot(self, i, sender_name, shard_id, byte_data, seq=0, flags=LAST_CHUNK):
+        '''
+        Write data to buffer slot i
+        Must be called while holding the lock for slot i
+        '''
+        self.__buffer[i] = (self.__locks[i], sender_name, shard_id, bytes(byte_data), seq, flags)
+        if config.DELIVERY == 'edf':
+            self.__shard_ids[i] = shard_id
+
+    def clear_slot(self, i):
+        '''
+        Clear buffer slot i (make it empty)
+        Must be called while holding the lock for slot i
+        '''
+        self.__buffer[i] = (self.__locks[i], None, None, None, 0, 0)
+        if config.DELIVERY == 'edf':
+            self.__shard_ids[i] = None
+
+    def slot_shard_ids(self):
+        '''Get the shard ID in every slot (None for empty slots) in one round trip'''
+        return list(self.__shard_ids)
+
+
+class SharedMemoryBuffer(SlotBuffer):
+    '''
+    Shared memory buffer class - same slot interface as SharedBuffer, but the
+    slots live in one multiprocessing.shared_memory block. Each slot is a small
+    header (state, shard_id, length, sender_name) followed by slot_size bytes,
+    so shard bytes are copied into a slot once and read back without pickling.
+    '''
+
+    def __init__(self, slot_size=None):
+        '''
+        Initialize the shared buffer with 4 fixed-size slots, each with a lock
+
+        Args:
+            slot_size: Max shard size in bytes (defaults to SHARED_BUFFER_SLOT_SIZE)
+        '''
+        if slot_size is None:
+            slot_size = config.SHARED_BUFFER_SLOT_SIZE
+        self.__slot_size = slot_size
+        self.__stride = SLOT_HEADER.size + slot_size
+
+        # a shared variable to indicate when the vj has all the shards
+        self.vj_has_all_shards = multiprocessing.Value('b', False)
+
+        # the lowest shard the vj is still missing
+        self.vj_watermark = multiprocessing.Value('i', 0)
+
+        # slots a fan may write into, and slots the vj may read from
+        self.free = multiprocessing.Semaphore(config.SHARED_BUFFER_SIZE)
+        self.filled = multiprocessing.Semaphore(0)
+
+        # one lock per slot, and one shared memory block for all the slots
+        self.__locks = [multiprocessing.Lock() for i in range(config.SHARED_BUFFER_SIZE)]
+        self.__shm = shared_memory.SharedMemory(
+            create=True, size=self.__stride * config.SHARED_BUFFER_SIZE)
+        for i in range(config.SHARED_BUFFER_SIZE):
+            self.clear_slot(i)
+
+    def __header(self, i):
+        state, flags, shard_id, seq, length, sender_name = SLOT_HEADER.unpack_from(
+            self.__shm.buf, i * self.__stride)
+        return (state, shard_id, length, sender_name)
+
+    def read_slot(self, i):
+        '''
+        Read buffer slot i with a single header unpack
+        Must be called while holding the lock for slot i
+        '''
+        return unpack_slot(self.__shm.buf, i * self.__stride)
+
+    def slot_size(self):
+        '''Get the max number of bytes a slot can hold'''
+        return self.__slot_size
+
+    def lock(self, i):
+        '''Get the lock for buffer slot i'''
+        return self.__locks[i]
+
+    def sender_name(self, i):
+        '''Get the sender name from buffer slot i'''
+        state, shard_id, length, sender_name = self.__header(i)
+        if state == SLOT_EMPTY:
+            return None
+        return sender_name.rstrip(b'\0').decode('utf-8', 'ignore')
+
+    def shard_id(self, i):
+        '''Get the shard ID from buffer slot i'''
+        state, shard_id, length, sender_name = self.__header(i)
+        if state == SLOT_EMPTY:
+            return None
+        return shard_id
+
+    def byte_data(self, i):
+        '''
+        Get the byte data from buffer slot i as a memoryview into the slot
+        The view is only valid until the slot is cleared
+        '''
+        state, shard_id, length, sender_name = self.__header(i)
+        if state == SLOT_EMPTY:
+            return None
+        offset = i * self.__stride + SLOT_HEADER.size
+        return self.__shm.buf[offset:offset + length]
+
+    def buffer(self):
+        '''Get the entire buffer as one memoryview per slot'''
+        return [self.__shm.buf[i * self.__stride:(i + 1) * self.__stride]
+                for i in range(config.SHARED_BUFFER_SIZE)]
+
+    def is_slot_empty(self, i):
+        '''Check if buffer slot i is empty (no data)'''
+        return self.__shm.buf[i * self.__stride] == SLOT_EMPTY
+
+    def is_slot_full(self, i):
+        '''Check if buffer slot i is full (has data)'''
+        return self.__shm.buf[i * self.__stride] == SLOT_FULL
+
+    def write_to_slot(self, i, sender_name, shard_id, byte_data, seq=0, flags=LAST_CHUNK):
         '''
         Write data to buffer slot i
         Must be called while holding the lock for slot i
         '''
-        lock = self.__buffer[i][0]
-        self.__buffer[i] = (lock, sender_name, shard_id, byte_data)
+        pack_slot(self.__shm.buf, i * self.__stride, self.__slot_size,
+                  sender_name, shard_id, byte_data, seq, flags)
 
     def clear_slot(self, i):
         '''
         Clear buffer slot i (make it empty)
         Must be called while holding the lock for slot i
         '''
-        lock = self.__buffer[i][0]
-        self.__buffer[i] = (lock, None, None, None)
\ No newline at end of file
+        SLOT_HEADER.pack_into(self.__shm.buf, i * self.__stride, SLOT_EMPTY, 0, -1, 0, 0, b'')
+
+    def close(self):
+        '''Release the shared memory block (call once from the creating process)'''
+        self.__shm.unlink()
+        self.__shm.close()
+
+
+
+class Lane(object):
+    '''
+    Lane class - the fan end of one LaneBuffer lane
+    Has the same send interface as the shared buffer, so a fan can't tell
+    whether it's writing into its own lane or into the shared slots
+    '''
+
+    def __init__(self, lane_buffer, i):
+        self.__lane_buffer = lane_buffer
+        self.__index = i
+        self.vj_has_all_shards = lane_buffer.vj_has_all_shards
+        self.vj_watermark = lane_buffer.vj_watermark
+
+    def index(self):
+        return self.__index
+
+    def is_done(self):
+        '''Check if the VJ has all the shards'''
+        return bool(self.vj_has_all_shards.value)
+
+    def watermark(self):
+        '''Get the lowest shard the VJ is still missing'''
+        return self.vj_watermark.value
+
+    def send(self, sender_name, shard_id, byte_data, seq=0, flags=LAST_CHUNK):
+        '''Write a shard (or one chunk of a shard) into this lane, see LaneBuffer.send'''
+        return self.__lane_buffer.send(self.__index, sender_name, shard_id, byte_data, seq, flags)
+
+
+class LaneBuffer(object):
+    '''
+    Lane buffer class - one single-producer/single-consumer ring per fan
+
+    Each fan owns a lane of LANE_SIZE shared memory slots and is its only
+    writer, and the VJ is the only reader of every lane, so slots need no
+    locks. The fan advances the lane head after writing a slot, the VJ
+    advances the tail after reading one. A per-lane free semaphore blocks a
+    fan whose lane is full, and one filled semaphore wakes the VJ when any
+    lane has a shard. The VJ serves non-empty lanes round-robin.
+
+    Lane buffers implement the transport interface (see transport.Transport)
+    '''
+
+    def __init__(self, num_lanes, slot_size=None):
+        '''
+        Initialize one lane per fan
+
+        Args:
+            num_lanes: Number of lanes (one per fan)
+            slot_size: Max shard size in bytes (defaults to SHARED_BUFFER_SLOT_SIZE)
+        '''
+        if slot_size is None:
+            slot_size = config.SHARED_BUFFER_SLOT_SIZE
+        self.__num_lanes = num_lanes
+        self.__slot_size = slot_size
+        self.__stride = SLOT_HEADER.size + slot_size
+        self.__lane_stride = LANE_HEADER.size + self.__stride * config.LANE_SIZE
+
+        # the lane the vj serves next
+        self.__next_lane = 0
+
+        # a shared variable to indicate when the vj has all the shards
+        self.vj_has_all_shards = multiprocessing.Value('b', False)
+
+        # the lowest shard the vj is still missing
+        self.vj_watermark = multiprocessing.Value('i', 0)
+
+        # slots each fan may write into, and shards the vj may read from
+        self.__free = [multiprocessing.Semaphore(config.LANE_SIZE) for i in range(num_lanes)]
+        self.filled = multiprocessing.Semaphore(0)
+
+        self.__shm = shared_memory.SharedMemory(create=True, size=self.__lane_stride * num_lanes)
+        for i in range(num_lanes):
+            LANE_HEADER.pack_into(self.__shm.buf, i * self.__lane_stride, 0, 0)
+
+    def __slot_offset(self, lane, n):
+        return lane * self.__lane_stride + LANE_HEADER.size + (n % config.LANE_SIZE) * self.__stride
+
+    def num_lanes(self):
+        return self.__num_lanes
+
+    def slot_size(self):
+        '''Get the max number of bytes a lane slot can hold'''
+        return self.__slot_size
+
+    def lane(self, i):
+        '''Get the fan end of lane i'''
+        return Lane(self, i)
+
+    def endpoint(self, i):
+        '''Get the object fan i sends through (its own lane)'''
+        return self.lane(i)
+
+    def done(self):
+        '''Signal to all fans that the VJ has all the shards'''
+        self.vj_has_all_shards.value = True
+
+    def is_done(self):
+        '''Check if the VJ has all the shards'''
+        return bool(self.vj_has_all_shards.value)
+
+    def set_watermark(self, shard_id):
+        '''Publish the lowest shard the VJ is still missing'''
+        self.vj_watermark.value = shard_id
+
+    def watermark(self):
+        '''Get the lowest shard the VJ is still missing'''
+        return self.vj_watermark.value
+
+    def size(self, i):
+        '''Get the number of shards waiting in lane i'''
+        head, tail = LANE_HEADER.unpack_from(self.__shm.buf, i * self.__lane_stride)
+        return head - tail
+
+    def send(self, i, sender_name, shard_id, byte_data, seq=0, flags=LAST_CHUNK):
+        '''
+        Write a shard (or one chunk of a shard) into lane i
+        Blocks until the lane has a free slot or the VJ has all shards
+        Must only be called by the fan that owns lane i
+        A whole shard larger than a slot is sent as slot-sized chunks
+
+        Returns:
+            int: the (last) lane slot index written, or None if the VJ already has all shards
+        '''
+        if not check_slot_size(self.__slot_size, shard_id, byte_data, seq, flags):
+            for message in chunk_message(shard_id, byte_data, self.__slot_size):
+                slot_index = self.send(i, sender_name, *message)
+                if slot_index is None:
+                    return None
+            return slot_index
+
+        while not self.__free[i].acquire(True, config.SHARED_BUFFER_TIMEOUT):
+            if self.vj_has_all_shards.value:
+                return None
+
+        offset = i * self.__lane_stride
+        head, tail = LANE_HEADER.unpack_from(self.__shm.buf, offset)
+        pack_slot(self.__shm.buf, self.__slot_offset(i, head), self.__slot_size,
+                  sender_name, shard_id, byte_data, seq, flags)
+
+        # publish the slot, then wake the VJ
+        LANE_COUNTER.pack_into(self.__shm.buf, offset, head + 1)
+        self.filled.release()
+        return head % config.LANE_SIZE
+
+    def __receive_order(self):
+        lanes = [(self.__next_lane + n) % self.__num_lanes for n in range(self.__num_lanes)]
+        if config.DELIVERY != 'edf':
+            return lanes
+
+        # the shard at the tail of each non-empty lane, lowest first
+        waiting = []
+        for i in lanes:
+            head, tail = LANE_HEADER.unpack_from(self.__shm.buf, i * self.__lane_stride)
+            if head != tail:
+                state, flags, shard_id, seq, length, sender_name = SLOT_HEADER.unpack_from(
+                    self.__shm.buf, self.__slot_offset(i, tail))
+                waiting.append((shard_id, seq, i))
+        return [i for shard_id, seq, i in sorted(waiting)]
+
+    def receive(self, timeout=None):
+        '''
+        Read the next shard, taking non-empty lanes in round-robin order (or
+        the lane with the lowest shard ID first with DELIVERY 'edf')
+        Blocks until any lane has a shard or the timeout expires
+
+        Args:
+            timeout: Seconds to wait for a shard (None waits forever)
+
+        Returns:
+            tuple: (shard_id, byte_data, sender_name, seq, flags) or None on timeout
+        '''
+        if not self.filled.acquire(True, timeout):
+            return None
+
+        for i in self.__receive_order():
+            offset = i * self.__lane_stride
+            head, tail = LANE_HEADER.unpack_from(self.__shm.buf, offset)
+            if head == tail:
+                continue
+
+            # copy the shard out before handing the slot back to the fan
+            sender_name, shard_id, byte_data, seq, flags = unpack_slot(
+                self.__shm.buf, self.__slot_offset(i, tail))
+            byte_data = bytes(byte_data)
+
+            LANE_COUNTER.pack_into(self.__shm.buf, offset + LANE_COUNTER.size, tail + 1)
+            self.__free[i].release()
+            self.__next_lane = (i + 1) % self.__num_lanes
+            logger.debug(f'read shard {shard_id} from lane {i} (from {sender_name})')
+            return (shard_id, byte_data, sender_name, seq, flags)
+
+        logger.error('lane buffer signalled a shard but every lane was empty')
+        return None
+
+    def close(self):
+        '''Release the shared memory block (call once from the creating process)'''
+        self.__shm.unlink()
+        self.__shm.close()
@@ -1,7 +1,9 @@
 
 import multiprocessing
+from unittest.mock import patch
 
 import config
+import pytest
 import shared_buffer
 
 
@@ -16,3 +18,124 @@ def test_str():
     sh = shared_buffer.SharedBuffer(manager)
     s = str(sh)
     assert s
+
+
+def test_shm_init():
+    sh = shared_buffer.SharedMemoryBuffer(slot_size=16)
+    assert len(sh.buffer()) == config.SHARED_BUFFER_SIZE
+    for i in range(config.SHARED_BUFFER_SIZE):
+        assert sh.is_slot_empty(i)
+    sh.close()
+
+
+def test_shm_write_read():
+    sh = shared_buffer.SharedMemoryBuffer(slot_size=16)
+    sh.write_to_slot(1, 'fan1', 7, b'beef')
+    assert sh.is_slot_full(1)
+    assert sh.sender_name(1) == 'fan1'
+    assert sh.shard_id(1) == 7
+    assert bytes(sh.byte_data(1)) == b'beef'
+    sh.clear_slot(1)
+    assert sh.is_slot_empty(1)
+    assert sh.byte_data(1) is None
+    sh.close()
+
+
+def test_shm_slot_too_small():
+    sh = shared_buffer.SharedMemoryBuffer(slot_size=2)
+    with pytest.raises(ValueError):
+        sh.write_to_slot(0, 'fan0', 0, b'beef')
+    sh.close()
+
+
+def test_shm_send_receive():
+    sh = shared_buffer.SharedMemoryBuffer(slot_size=16)
+    slot_index = sh.send('fan1', 7, b'beef')
+    assert sh.is_slot_full(slot_index)
+    assert sh.receive(0.1) == (7, b'beef', 'fan1', 0, 1)
+    assert sh.is_slot_empty(slot_index)
+    assert sh.receive(0.1) is None
+    sh.close()
+
+
+def test_send_receive():
+    manager = multiprocessing.Manager()
+    sh = shared_buffer.SharedBuffer(manager)
+    sh.send('fan1', 7, b'beef')
+    assert sh.receive(0.1) == (7, b'beef', 'fan1', 0, 1)
+    assert sh.receive(0.1) is None
+
+
+def test_lanes_send_receive():
+    sh = shared_buffer.LaneBuffer(2, slot_size=16)
+    sh.lane(0).send('fan0', 0, b'beef')
+    sh.lane(0).send('fan0', 1, b'cafe')
+    sh.lane(1).send('fan1', 2, b'f00d')
+    assert sh.size(0) == 2
+    # non-empty lanes are served round-robin
+    assert sh.receive(0.1) == (0, b'beef', 'fan0', 0, 1)
+    assert sh.receive(0.1) == (2, b'f00d', 'fan1', 0, 1)
+    assert sh.receive(0.1) == (1, b'cafe', 'fan0', 0, 1)
+    assert sh.receive(0.1) is None
+    sh.close()
+
+
+@patch('config.LANE_SIZE', 1)
+@patch('config.SHARED_BUFFER_TIMEOUT', 0.01)
+def test_lane_full():
+    sh = shared_buffer.LaneBuffer(1, slot_size=16)
+    sh.lane(0).send('fan0', 0, b'beef')
+    sh.vj_has_all_shards.value = True
+    assert sh.lane(0).send('fan0', 1, b'cafe') is None
+    sh.close()
+
+
+def test_shm_send_large_shard():
+    sh = shared_buffer.SharedMemoryBuffer(slot_size=4)
+    sh.send('fan1', 7, b'beefcafe00')
+    # the chunks land in whichever slots are free
+    chunks = sorted((sh.receive(0.1) for i in range(3)), key=lambda chunk: chunk[3])
+    assert chunks == [(7, b'beef', 'fan1', 0, 0), (7, b'cafe', 'fan1', 1, 0), (7, b'00', 'fan1', 2, 1)]
+    sh.close()
+
+
+def test_shm_send_large_batch():
+    sh = shared_buffer.SharedMemoryBuffer(slot_size=4)
+    with pytest.raises(ValueError):
+        sh.send('fan1', 7, b'beefcafe', 0, 3)
+    # the slot wasn't reserved
+    for i in range(config.SHARED_BUFFER_SIZE):
+        assert sh.send('fan1', i, b'beef') is not None
+    sh.close()
+
+
+def test_lanes_send_large_shard():
+    sh = shared_buffer.LaneBuffer(1, slot_size=4)
+    sh.lane(0).send('fan0', 0, b'beefcafe')
+    assert sh.receive(0.1) == (0, b'beef', 'fan0', 0, 0)
+    assert sh.receive(0.1) == (0, b'cafe', 'fan0', 1, 1)
+    sh.close()
+
+
+@patch('config.DELIVERY', 'edf')
+def test_shm_receive_edf():
+    sh = shared_buffer.SharedMemoryBuffer(slot_size=16)
+    sh.send('fan1', 3, b'beef')
+    sh.send('fan1', 1, b'cafe')
+    sh.set_watermark(1)
+    assert sh.watermark() == 1
+    assert sh.receive(0.1)[0] == 1
+    assert sh.receive(0.1)[0] == 3
+    sh.close()
+
+
+@patch('config.DELIVERY', 'edf')
+def test_lanes_receive_edf():
+    sh = shared_buffer.LaneBuffer(2, slot_size=16)
+    sh.lane(0).send('fan0', 5, b'beef')
+    sh.lane(1).send('fan1', 2, b'cafe')
+    sh.set_watermark(2)
+    assert sh.lane(0).watermark() == 2
+    assert sh.receive(0.1)[0] == 2
+    assert sh.receive(0.1)[0] == 5
+    sh.close()
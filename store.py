@@ -0,0 +1,100 @@
+import json
+import os
+import shutil
+
+from config import logger
+
+
+class ShardStore(object):
+    '''
+    Content-addressed shard store class - every distinct shard is kept once,
+    as a blob named after its hash (see video.file_hash)
+
+    Shard files are hard links to the blobs (copies where the filesystem
+    can't link), so identical shards of different videos or renditions share
+    one blob. Recipes map how a shard was cut (source hash, start, end, ...)
+    to the blob it produced, so re-sharding an unchanged source only cuts the
+    shards whose recipe is new.
+    '''
+
+    def __init__(self, store_dir):
+        '''
+        Args:
+            store_dir: Directory holding the blobs and the recipes json file
+        '''
+        self.__store_dir = store_dir
+        self.__recipes_file_path = os.path.join(store_dir, 'recipes.json')
+        self.__recipes = None  # recipe -> blob hash, read on first use
+
+    def blob_path(self, hash):
+        '''Get the path of the blob with a hash'''
+        return os.path.join(self.__store_dir, hash[:2], hash + '.mp4')
+
+    def has(self, hash):
+        return os.path.exists(self.blob_path(hash))
+
+    def put(self, file_path, hash):
+        '''
+        Add a shard file to the store, then make the file a link to its blob
+        (a shard that is already stored is only kept once)
+
+        Args:
+            file_path: The shard file
+            hash: The hash of the shard file
+        '''
+        blob_path = self.blob_path(hash)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            link(file_path, blob_path)
+        elif not os.path.samefile(file_path, blob_path):
+            link(blob_path, file_path)
+
+    def get(self, hash, file_path):
+        '''Write the blob with a hash to file_path (as a link)'''
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        link(self.blob_path(hash), file_path)
+
+    def recipe(self, key):
+        '''
+        Get the blob cut by a recipe
+
+        Returns:
+            str: the blob's hash, or None if the recipe is new or its blob is gone
+        '''
+        hash = self.__load_recipes().get(key)
+        if hash is None or not self.has(hash):
+            return None
+        return hash
+
+    def set_recipes(self, recipes):
+        '''Remember the blobs cut by recipes (a dict recipe -> hash)'''
+        self.__load_recipes().update(recipes)
+        os.makedirs(self.__store_dir, exist_ok=True)
+        temp_file_path = self.__recipes_file_path + '.tmp'
+        with open(temp_file_path, 'w') as file:
+            json.dump(self.__recipes, file, indent=4)
+        os.replace(temp_file_path, self.__recipes_file_path)
+
+    def __load_recipes(self):
+        if self.__recipes is None:
+            self.__recipes = {}
+            try:
+                with open(self.__recipes_file_path) as file:
+                    self.__recipes = json.load(file)
+            except FileNotFoundError:
+                pass
+            except ValueError as e:
+                logger.warning(f'Unable to read {self.__recipes_file_path} exception={type(e).__name__}')
+        return self.__recipes
+
+
+def link(src_file_path, dst_file_path):
+    '''Replace dst with a hard link to src, or a copy where the filesystem can't link'''
+    temp_file_path = dst_file_path + '.tmp'
+    if os.path.exists(temp_file_path):
+        os.remove(temp_file_path)
+    try:
+        os.link(src_file_path, temp_file_path)
+    except OSError:
+        shutil.copyfile(src_file_path, temp_file_path)
+    os.replace(temp_file_path, dst_file_path)
@@ -0,0 +1,39 @@
+import os
+
+import store
+
+
+def test_put_get(tmp_path):
+    s = store.ShardStore(str(tmp_path / 'store'))
+    file_path = tmp_path / 'shard_0.mp4'
+    file_path.write_bytes(b'beef')
+    assert not s.has('0123456789abcdef')
+    s.put(str(file_path), '0123456789abcdef')
+    assert s.has('0123456789abcdef')
+    assert os.path.samefile(str(file_path), s.blob_path('0123456789abcdef'))
+
+    s.get('0123456789abcdef', str(tmp_path / 'shards' / 'shard_1.mp4'))
+    assert (tmp_path / 'shards' / 'shard_1.mp4').read_bytes() == b'beef'
+
+
+def test_put_duplicate(tmp_path):
+    s = store.ShardStore(str(tmp_path / 'store'))
+    for name in ['a.mp4', 'b.mp4']:
+        (tmp_path / name).write_bytes(b'beef')
+        s.put(str(tmp_path / name), '0123456789abcdef')
+    # the same shard of another video is stored once
+    assert os.path.samefile(str(tmp_path / 'a.mp4'), str(tmp_path / 'b.mp4'))
+
+
+def test_recipes(tmp_path):
+    s = store.ShardStore(str(tmp_path / 'store'))
+    file_path = tmp_path / 'shard_0.mp4'
+    file_path.write_bytes(b'beef')
+    s.put(str(file_path), '0123456789abcdef')
+    s.set_recipes({'source 0.0 2.0 copy': '0123456789abcdef', 'source 2.0 4.0 copy': 'fedcba9876543210'})
+
+    s = store.ShardStore(str(tmp_path / 'store'))
+    assert s.recipe('source 0.0 2.0 copy') == '0123456789abcdef'
+    # the blob is gone
+    assert s.recipe('source 2.0 4.0 copy') is None
+    assert s.recipe('source 4.0 6.0 copy') is None
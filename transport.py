@@ -0,0 +1,391 @@
+import asyncio
+import copy
+import multiprocessing
+import os
+import queue
+import selectors
+import socket
+import struct
+import tempfile
+
+import config
+import shared_buffer as sb
+from config import logger
+
+# message flags
+LAST_CHUNK = sb.LAST_CHUNK
+BATCH = 2  # the payload packs several whole shards (see pack_batch)
+
+# split a whole shard into numbered chunks
+chunk_message = sb.chunk_message
+
+# batch record header: (shard_id, byte_data length)
+BATCH_RECORD = struct.Struct('<iI')
+
+# socket message header: (shard_id, seq, flags, sender_name length, byte_data length)
+MESSAGE_HEADER = struct.Struct('<iIBHQ')
+
+# transport names accepted by create_transport ('socket' needs Unix domain
+# sockets, which CPython doesn't have on Windows)
+TRANSPORTS = ['manager', 'shm', 'lanes', 'queue']
+if hasattr(socket, 'AF_UNIX'):
+    TRANSPORTS.append('socket')
+
+
+class Transport(object):
+    '''
+    Transport base class - delivers shards from the fans to the VJ
+
+    Every transport has the same interface, so Fan and VideoJockey don't care
+    how shards travel:
+        endpoint(i)   - the object fan i sends through (often the transport itself)
+        send(sender_name, shard_id, byte_data, seq=0, flags=LAST_CHUNK)
+                      - blocks until the shard is handed over, returns None if
+                        the VJ already has all shards
+        receive(timeout)
+                      - blocks until a shard arrives, returns
+                        (shard_id, byte_data, sender_name, seq, flags) or None
+                        on timeout
+        done()        - the VJ signals that it has all shards
+        is_done()     - fans check whether the VJ has all shards
+        set_watermark(shard_id)
+                      - the VJ publishes the lowest shard it's still missing
+        watermark()   - fans check the VJ's watermark
+        close()       - release the transport (creating process only)
+
+    A message is either a whole shard (seq 0, LAST_CHUNK set), chunk number
+    seq of a shard (LAST_CHUNK set on the shard's final chunk), or a batch of
+    whole shards (BATCH set, see pack_batch).
+
+    The slot buffers in shared_buffer (SharedBuffer, SharedMemoryBuffer and
+    LaneBuffer) implement the same interface.
+    '''
+
+    def __init__(self):
+        # a shared variable to indicate when the vj has all the shards
+        self.vj_has_all_shards = multiprocessing.Value('b', False)
+
+        # the lowest shard the vj is still missing
+        self.vj_watermark = multiprocessing.Value('i', 0)
+
+    def endpoint(self, i):
+        '''Get the object fan i sends through'''
+        return self
+
+    def done(self):
+        '''Signal to all fans that the VJ has all the shards'''
+        self.vj_has_all_shards.value = True
+
+    def is_done(self):
+        '''Check if the VJ has all the shards'''
+        return bool(self.vj_has_all_shards.value)
+
+    def set_watermark(self, shard_id):
+        '''Publish the lowest shard the VJ is still missing'''
+        self.vj_watermark.value = shard_id
+
+    def watermark(self):
+        '''Get the lowest shard the VJ is still missing'''
+        return self.vj_watermark.value
+
+    def send(self, sender_name, shard_id, byte_data, seq=0, flags=LAST_CHUNK):
+        raise NotImplementedError
+
+    def receive(self, timeout=None):
+        raise NotImplementedError
+
+    def close(self):
+        '''Release the transport (nothing to release by default)'''
+        pass
+
+
+def pack_batch(shards):
+    '''
+    Pack several whole shards into one message payload
+
+    Args:
+        shards: List of (shard_id, byte_data)
+
+    Returns:
+        bytes: BATCH_RECORD header + byte_data for each shard, back to back
+    '''
+    parts = []
+    for shard_id, byte_data in shards:
+        parts.append(BATCH_RECORD.pack(shard_id, len(byte_data)))
+        parts.append(byte_data)
+    return b''.join(parts)
+
+
+def unpack_batch(byte_data):
+    '''
+    Unpack a payload built by pack_batch
+
+    Returns:
+        list: (shard_id, byte_data) for each shard in the batch
+    '''
+    view = memoryview(byte_data)
+    shards = []
+    offset = 0
+    while offset < len(view):
+        shard_id, length = BATCH_RECORD.unpack_from(view, offset)
+        offset += BATCH_RECORD.size
+        shards.append((shard_id, bytes(view[offset:offset + length])))
+        offset += length
+    return shards
+
+
+class BatchSizer(object):
+    '''
+    Batch sizer class - picks how many shards a fan packs into one message
+
+    The batch doubles while sends wait longer than the wait target (the
+    transport is busy, so fewer and bigger transactions pay off) and shrinks
+    by one when they don't (small batches keep latency down). A batch never
+    holds more than max_bytes, so large shards go out on their own.
+    '''
+
+    def __init__(self, max_shards=None, max_bytes=None, wait_target=None):
+        if max_shards is None:
+            max_shards = config.BATCH_MAX_SHARDS
+        if max_bytes is None:
+            max_bytes = config.BATCH_MAX_BYTES
+            if config.CHUNK_SIZE > 0:
+                max_bytes = min(max_bytes, config.CHUNK_SIZE)
+        if wait_target is None:
+            wait_target = config.BATCH_WAIT_TARGET
+        self.__max_shards = max_shards
+        self.__max_bytes = max_bytes
+        self.__wait_target = wait_target
+        self.__size = 1
+
+    def size(self):
+        '''Get the current batch size in shards'''
+        return self.__size
+
+    def max_bytes(self):
+        '''Get the max batch payload size in bytes'''
+        return self.__max_bytes
+
+    def take(self, shards):
+        '''
+        Get the next batch from the front of a list of (shard_id, byte_data)
+
+        Returns:
+            list: at least one shard, at most size() shards and max_bytes()
+                  bytes (unless the first shard alone is bigger)
+        '''
+        batch = [shards[0]]
+        num_bytes = BATCH_RECORD.size + len(shards[0][1])
+        for shard in shards[1:self.__size]:
+            num_bytes += BATCH_RECORD.size + len(shard[1])
+            if num_bytes > self.__max_bytes:
+                break
+            batch.append(shard)
+        return batch
+
+    def observe(self, wait):
+        '''
+        Adapt the batch size to how long the last send waited
+
+        Args:
+            wait: Seconds the last send spent waiting on the transport
+        '''
+        if wait > self.__wait_target:
+            self.__size = min(self.__size * 2, self.__max_shards)
+        else:
+            self.__size = max(self.__size - 1, 1)
+
+
+class AsyncTransport(object):
+    '''
+    Async transport class - awaitable wrapper around a fan's transport endpoint
+    A send that blocks on the transport runs in the event loop's thread pool,
+    so the other fans on the same loop keep going
+    '''
+
+    def __init__(self, transport):
+        self.__transport = transport
+
+    def transport(self):
+        return self.__transport
+
+    def is_done(self):
+        '''Check if the VJ has all the shards'''
+        return self.__transport.is_done()
+
+    def watermark(self):
+        '''Get the lowest shard the VJ is still missing'''
+        return self.__transport.watermark()
+
+    async def send(self, sender_name, shard_id, byte_data, seq=0, flags=LAST_CHUNK):
+        '''Send a message without blocking the event loop, see Transport.send'''
+        return await asyncio.to_thread(self.__transport.send, sender_name, shard_id, byte_data, seq, flags)
+
+
+class QueueTransport(Transport):
+    '''
+    Queue transport class - a bounded multiprocessing.Queue (a pipe plus a
+    feeder thread) holding up to SHARED_BUFFER_SIZE shards
+    '''
+
+    def __init__(self):
+        super().__init__()
+        self.__queue = multiprocessing.Queue(config.SHARED_BUFFER_SIZE)
+
+    def send(self, sender_name, shard_id, byte_data, seq=0, flags=LAST_CHUNK):
+        '''Put a shard on the queue, blocks while the queue is full'''
+        message = (shard_id, bytes(byte_data), sender_name, seq, flags)
+        while True:
+            try:
+                self.__queue.put(message, True, config.SHARED_BUFFER_TIMEOUT)
+                return True
+            except queue.Full:
+                if self.is_done():
+                    return None
+
+    def receive(self, timeout=None):
+        '''Get a shard from the queue'''
+        try:
+            return self.__queue.get(True, timeout)
+        except queue.Empty:
+            return None
+
+
+def recv_exactly(sock, n):
+    '''
+    Read exactly n bytes from a socket
+
+    Returns:
+        bytearray: the bytes read, or None if the peer closed the socket
+    '''
+    data = bytearray(n)
+    view = memoryview(data)
+    received = 0
+    while received < n:
+        count = sock.recv_into(view[received:])
+        if count == 0:
+            return None
+        received += count
+    return data
+
+
+class SocketTransport(Transport):
+    '''
+    Socket transport class - each fan connects to the VJ over a Unix domain
+    socket and streams length-prefixed shards. The kernel socket buffers
+    provide the backpressure, and the VJ waits on all the connections at once.
+    '''
+
+    def __init__(self, num_fans):
+        super().__init__()
+        self.__dir = tempfile.mkdtemp(prefix='carter_')
+        self.__path = os.path.join(self.__dir, 'vj.sock')
+
+        # the vj end, listening before any fan starts
+        self.__listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.__listener.bind(self.__path)
+        self.__listener.listen(num_fans)
+
+        # the fan end connects lazily, in the fan process
+        self.__sock = None
+
+        # the vj waits on the listener and every fan connection
+        self.__selector = None
+        self.__ready = []
+
+    def path(self):
+        return self.__path
+
+    def endpoint(self, i):
+        '''Get the object fan i sends through (a copy with its own connection)'''
+        endpoint = copy.copy(self)
+        endpoint.__sock = None
+        return endpoint
+
+    def send(self, sender_name, shard_id, byte_data, seq=0, flags=LAST_CHUNK):
+        '''Write one length-prefixed shard to the VJ'''
+        if self.is_done():
+            return None
+        try:
+            if self.__sock is None:
+                self.__sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                self.__sock.connect(self.__path)
+            name = sender_name.encode('utf-8')
+            header = MESSAGE_HEADER.pack(shard_id, seq, flags, len(name), len(byte_data))
+            self.__sock.sendall(header + name)
+            self.__sock.sendall(byte_data)
+        except OSError as e:
+            # the vj hung up, it has everything it needs
+            logger.debug(f'socket transport send failed exception={type(e).__name__}')
+            return None
+        return True
+
+    def receive(self, timeout=None):
+        '''Read the next shard from whichever fan connection is ready'''
+        if self.__selector is None:
+            self.__selector = selectors.DefaultSelector()
+            self.__selector.register(self.__listener, selectors.EVENT_READ)
+
+        while True:
+            if not self.__ready:
+                events = self.__selector.select(timeout)
+                if not events:
+                    return None
+                self.__ready = [key.fileobj for key, mask in events]
+
+            sock = self.__ready.pop(0)
+            if sock is self.__listener:
+                conn, addr = self.__listener.accept()
+                self.__selector.register(conn, selectors.EVENT_READ)
+                continue
+
+            header = recv_exactly(sock, MESSAGE_HEADER.size)
+            if header is None:
+                # the fan finished and closed its end
+                self.__selector.unregister(sock)
+                sock.close()
+                continue
+
+            shard_id, seq, flags, name_length, data_length = MESSAGE_HEADER.unpack(header)
+            sender_name = recv_exactly(sock, name_length).decode('utf-8')
+            byte_data = recv_exactly(sock, data_length)
+            return (shard_id, byte_data, sender_name, seq, flags)
+
+    def close(self):
+        '''Close the listener and remove the socket file'''
+        self.__listener.close()
+        if os.path.exists(self.__path):
+            os.remove(self.__path)
+        os.rmdir(self.__dir)
+
+
+def create_transport(name, num_fans, manager=None, slot_size=None):
+    '''
+    Create a fan -> VJ transport by name
+
+    Args:
+        name: One of TRANSPORTS (ValueError otherwise)
+        num_fans: Number of fans that will send through the transport
+        manager: A multiprocessing.Manager (only used by 'manager')
+        slot_size: Max shard size in bytes (only used by 'shm' and 'lanes',
+                   defaults to CHUNK_SIZE when shards are sent in chunks)
+
+    Returns:
+        The transport
+    '''
+    if name not in TRANSPORTS:
+        logger.error(f'Unknown transport {name}, expected one of {TRANSPORTS}')
+        raise ValueError(f'unknown transport {name}')
+
+    if slot_size is None and config.CHUNK_SIZE > 0:
+        slot_size = config.CHUNK_SIZE
+
+    if name == 'manager':
+        return sb.SharedBuffer(manager)
+    elif name == 'shm':
+        return sb.SharedMemoryBuffer(slot_size)
+    elif name == 'lanes':
+        return sb.LaneBuffer(num_fans, slot_size)
+    elif name == 'queue':
+        return QueueTransport()
+    return SocketTransport(num_fans)
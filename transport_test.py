@@ -0,0 +1,80 @@
+import multiprocessing
+from unittest.mock import patch
+
+import pytest
+import transport as tr
+
+
+def test_queue_send_receive():
+    t = tr.QueueTransport()
+    assert t.send('fan1', 7, b'beef')
+    assert t.receive(1) == (7, b'beef', 'fan1', 0, 1)
+    assert t.receive(0.1) is None
+    t.close()
+
+
+@pytest.mark.skipif('socket' not in tr.TRANSPORTS, reason='no Unix domain sockets')
+def test_socket_send_receive():
+    t = tr.SocketTransport(1)
+    assert t.send('fan1', 7, b'beef')
+    assert t.receive(1) == (7, b'beef', 'fan1', 0, 1)
+    assert t.receive(0.1) is None
+    t.close()
+
+
+def test_done():
+    t = tr.QueueTransport()
+    assert not t.is_done()
+    t.done()
+    assert t.endpoint(0).is_done()
+
+
+@pytest.mark.parametrize('name', tr.TRANSPORTS)
+def test_create_transport(name):
+    manager = multiprocessing.Manager() if name == 'manager' else None
+    t = tr.create_transport(name, 2, manager, 16)
+    assert t.endpoint(1).send('fan1', 7, b'beef') is not None
+    assert t.receive(1) == (7, b'beef', 'fan1', 0, 1)
+    t.endpoint(0).send('fan0', 8, memoryview(b'cafe'), 3, 0)
+    assert t.receive(1) == (8, b'cafe', 'fan0', 3, 0)
+    t.done()
+    assert t.endpoint(1).is_done()
+    t.close()
+
+
+def test_create_unknown_transport():
+    with pytest.raises(ValueError):
+        tr.create_transport('carrier-pigeon', 2)
+
+
+def test_create_unsupported_transport():
+    with patch('transport.TRANSPORTS', ['manager', 'shm', 'lanes', 'queue']):
+        with pytest.raises(ValueError):
+            tr.create_transport('socket', 2)
+
+
+def test_pack_unpack_batch():
+    shards = [(3, b'beef'), (4, b''), (5, memoryview(b'cafe'))]
+    byte_data = tr.pack_batch(shards)
+    assert tr.unpack_batch(byte_data) == [(3, b'beef'), (4, b''), (5, b'cafe')]
+
+
+def test_batch_sizer():
+    batch_sizer = tr.BatchSizer(max_shards=4, max_bytes=64, wait_target=0.001)
+    assert batch_sizer.size() == 1
+    batch_sizer.observe(0.1)
+    batch_sizer.observe(0.1)
+    batch_sizer.observe(0.1)
+    assert batch_sizer.size() == 4
+    batch_sizer.observe(0)
+    assert batch_sizer.size() == 3
+
+
+def test_batch_sizer_take():
+    batch_sizer = tr.BatchSizer(max_shards=4, max_bytes=32, wait_target=0.001)
+    shards = [(0, bytes(8)), (1, bytes(8)), (2, bytes(8))]
+    assert batch_sizer.take(shards) == shards[:1]
+    batch_sizer.observe(0.1)
+    batch_sizer.observe(0.1)
+    assert batch_sizer.take(shards) == shards[:2]
+    assert batch_sizer.take([(0, bytes(100))]) == [(0, bytes(100))]
@@ -3,12 +3,18 @@ import os
 import platform
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from os.path import isfile, join
 
 import config
 import ffmpeg
 import vlc
 from config import logger
+from hash_cache import HashCache
+from probe_cache import ProbeCache
+
+# every probe below goes through this cache, a file is only probed once
+probe_cache = ProbeCache(file_path=config.PROBE_CACHE_FILE_PATH)
 
 
 def end_reached_cb(event, params):
@@ -55,7 +61,9 @@ def shake256_hash(s):
     return hash
 
 
-def file_hash(file_path):
+def read_file_hash(file_path):
+    # Hashes the file HASH_CHUNK_SIZE bytes at a time, the same hash as
+    # shake256_hash(byte_data.decode('latin-1')) without holding the whole file
     try:
         file = open(file_path, 'rb')
     except Exception as e:
@@ -63,30 +71,69 @@ def file_hash(file_path):
             f'Unable to open {file_path} exception={type(e).__name__}')
         quit(-1)
 
-    byte_data = file.read()
-    file.close()
-
-    s = byte_data.decode('latin-1')
-    hash = shake256_hash(s)
+    m = hashlib.shake_256()
+    buffer = bytearray(config.HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with file:
+        while True:
+            n = file.readinto(buffer)
+            if not n:
+                break
+            m.update(str(view[:n], 'latin-1').encode())
+    hash = m.hexdigest(8)
     return hash
 
 
+# shards are only hashed again once they have changed
+hash_cache = HashCache(read_file_hash, config.HASH_CACHE_FILE_PATH)
+
+
+def file_hash(file_path):
+    return hash_cache.file_hash(file_path)
+
+
+def file_hashes(file_paths, num_workers=None):
+    # Hashes the files num_workers at a time (HASH_WORKERS by default)
+    if num_workers is None:
+        num_workers = config.HASH_WORKERS
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        return list(executor.map(file_hash, file_paths))
+
+
 def dimensions(video_file_path):
-    probe = ffmpeg.probe(video_file_path)
-    probe_video = next(
-        (stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
+    probe_video = probe(video_file_path)
     width = int(probe_video['width'])
     height = int(probe_video['height'])
     return (width, height)
 
 
 def probe(video_file_path):
-    probe = ffmpeg.probe(video_file_path)
+    probe = probe_cache.probe(video_file_path)
     probe_video = next(
         (stream for stream in probe['streams'] if stream['codec_type'] == 'video'), None)
     return probe_video
 
 
+def duration(video_file_path):
+    probe = probe_cache.probe(video_file_path)
+    return float(probe['format']['duration'])
+
+
+def keyframes(video_file_path):
+    # Reads the timestamp of every keyframe in the video stream from the packet index
+    probe = probe_cache.probe(video_file_path, select_streams='v:0', show_entries='packet=pts_time,flags')
+    times = [float(packet['pts_time']) for packet in probe.get('packets', [])
+             if 'K' in packet.get('flags', '') and packet.get('pts_time') not in (None, 'N/A')]
+    return sorted(times)
+
+
+def probe_audio(audio_file_path):
+    probe = probe_cache.probe(audio_file_path)
+    probe_audio = next(
+        (stream for stream in probe['streams'] if stream['codec_type'] == 'audio'), None)
+    return probe_audio
+
+
 def temp_file_path(name, ext):
     # Creates a valid path to a temp file
     if not os.path.exists(config.TEMP_DIR):
@@ -98,34 +145,130 @@ def temp_file_path(name, ext):
     return temp_file_path
 
 
+# codecs the mp4 container can hold as they are
+MP4_VIDEO_CODECS = ['h264', 'hevc', 'mpeg4', 'av1', 'vp9']
+MP4_AUDIO_CODECS = ['aac', 'mp3', 'alac', 'flac', 'opus', 'ac3', 'eac3']
+
+
+def audio_mux_codecs(input_video_file_path, input_audio_file_path):
+    # Picks stream copy for each stream the mp4 container can hold as it is,
+    # and a transcode for the rest
+    try:
+        probe_video = probe(input_video_file_path)
+        probe_audio_stream = probe_audio(input_audio_file_path)
+    except (ffmpeg.Error, OSError) as e:
+        logger.warning(f'Unable to probe the audio mux inputs exception={type(e).__name__}')
+        return ('libx264', 'aac')
+
+    vcodec = 'libx264'
+    if probe_video is not None and probe_video.get('codec_name') in MP4_VIDEO_CODECS:
+        vcodec = 'copy'
+    acodec = 'aac'
+    if probe_audio_stream is not None and probe_audio_stream.get('codec_name') in MP4_AUDIO_CODECS:
+        acodec = 'copy'
+    return (vcodec, acodec)
+
+
 def audio(name, input_video_file_path, input_audio_file_path):
     
     # Adds audio back into file using ffmpeg
+    # With AUDIO_MODE 'mux' the video stream and the audio stream are mapped
+    # into one container, stream copied where the container allows it
     print('Applying audio...')
     print(f'\tinput video file : {os.path.basename(input_video_file_path)}')
     print(f'\tinput audio file : {os.path.basename(input_audio_file_path)}')
     print(f'\tname             : {name}')
-    print('\tstatus           : processing...', end='')
 
     video_file = ffmpeg.input(input_video_file_path)
     audio_file = ffmpeg.input(input_audio_file_path)
     output_file = temp_file_path(name, '.mp4')
 
+    if config.AUDIO_MODE == 'mux':
+        vcodec, acodec = audio_mux_codecs(input_video_file_path, input_audio_file_path)
+        print(f'\tcodecs           : video {vcodec}, audio {acodec}')
+        print('\tstatus           : processing...', end='')
+        (
+            ffmpeg
+            .output(video_file.video, audio_file.audio, output_file,
+                    vcodec=vcodec, acodec=acodec, loglevel='quiet')
+            .run(overwrite_output=True)
+        )
+    else:
+        print('\tstatus           : processing...', end='')
+        (
+            ffmpeg
+            .concat(video_file, audio_file, v=1, a=1)
+            .output(output_file, loglevel='quiet')
+            .run(overwrite_output=True)
+        )
+
+    print('done')
+    print(f'\toutput file: {os.path.basename(output_file)}')
+    return output_file
+
+
+# video stream parameters that must match for stream copy concatenation
+STREAM_COPY_KEYS = ['codec_name', 'profile', 'width', 'height', 'pix_fmt', 'time_base']
+
+
+def stream_copy_params(video_file_path):
+    # The video stream parameters that decide whether files can be joined without re-encoding
+    probe_video = probe(video_file_path)
+    if probe_video is None:
+        return None
+    return tuple(probe_video.get(key) for key in STREAM_COPY_KEYS)
+
+
+def can_stream_copy(*input_video_file_paths):
+    # Checks all the videos have identical video stream parameters
+    params = None
+    for input_video_file_path in input_video_file_paths:
+        try:
+            file_params = stream_copy_params(input_video_file_path)
+        except (ffmpeg.Error, OSError) as e:
+            logger.warning(f'Unable to probe {input_video_file_path} exception={type(e).__name__}')
+            return False
+        if file_params is None or (params is not None and file_params != params):
+            return False
+        params = file_params
+    return True
+
+
+def concat_copy(output_file, *input_video_file_paths):
+    # Joins videos with the concat demuxer and stream copy (no decoding or re-encoding)
+    list_file_path = output_file + '.txt'
+    with open(list_file_path, 'w') as list_file:
+        for input_video_file_path in input_video_file_paths:
+            path = os.path.abspath(input_video_file_path).replace('\\', '/').replace("'", "'\\''")
+            list_file.write(f"file '{path}'\n")
+
+    try:
+        (
+            ffmpeg
+            .input(list_file_path, f='concat', safe=0)
+            .output(output_file, c='copy', an=None, loglevel='quiet')
+            .run(overwrite_output=True)
+        )
+    finally:
+        os.remove(list_file_path)
+
+
+def concat_filter(output_file, *input_video_file_paths):
+    # Joins videos with the concat filter (decodes and re-encodes everything)
+    video_files = [ffmpeg.input(input_video_file_path) for input_video_file_path in input_video_file_paths]
     (
         ffmpeg
-        .concat(video_file, audio_file, v=1, a=1)
+        .concat(*video_files)
         .output(output_file, loglevel='quiet')
         .run(overwrite_output=True)
     )
 
-    print('done')
-    print(f'\toutput file: {os.path.basename(output_file)}')
-    return output_file
-
 
 def concat(name, *input_video_file_paths):
     
     # Concatenates multiple video files together
+    # Stream copies when every video has the same codec parameters (CONCAT_MODE
+    # 'auto'), and falls back to re-encoding through the concat filter
     
     n = len(input_video_file_paths)
     if n == 0:
@@ -134,26 +277,91 @@ def concat(name, *input_video_file_paths):
 
     print('Applying concat...')
     print(f'\tinput       : {n} videos')
-    video_files = []
 
     for i in range(n):
         input_video_file_path = input_video_file_paths[i]
         if not os.path.exists(input_video_file_path):
             logger.error(f'Unable to access the file {input_video_file_path}')
             return None
-        input = ffmpeg.input(input_video_file_path)
-        video_files.append(input)
+
+    copy = config.CONCAT_MODE == 'copy' or \
+        (config.CONCAT_MODE == 'auto' and can_stream_copy(*input_video_file_paths))
 
     print(f'\tname        : {name}')
+    print(f'\tmode        : {"stream copy" if copy else "re-encode"}')
     print('\tstatus      : processing...', end='')
     output_file = temp_file_path(name, '.mp4')
 
-    (
+    if copy:
+        try:
+            concat_copy(output_file, *input_video_file_paths)
+        except ffmpeg.Error as e:
+            logger.warning(f'Stream copy concat failed, re-encoding exception={type(e).__name__}')
+            copy = False
+    if not copy:
+        concat_filter(output_file, *input_video_file_paths)
+
+    print('done')
+    print(f'\toutput file : {os.path.basename(output_file)}')
+    return output_file
+
+
+# MPEG-TS packet size, every packet starts with the sync byte
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+
+
+def is_mpegts(byte_data):
+    # Checks whether a shard is an MPEG-TS stream (shards in MPEG-TS can be
+    # joined by concatenating their bytes, mp4 shards can't)
+    n = len(byte_data)
+    return n >= TS_PACKET_SIZE and n % TS_PACKET_SIZE == 0 and \
+        byte_data[0] == TS_SYNC_BYTE and byte_data[n - TS_PACKET_SIZE] == TS_SYNC_BYTE
+
+
+def can_pipe(byte_data):
+    # Checks whether shards like this one can be streamed into one ffmpeg
+    # process (VJ_OUTPUT 'pipe', or 'auto' and the shards are MPEG-TS)
+    return config.VJ_OUTPUT == 'pipe' or (config.VJ_OUTPUT == 'auto' and is_mpegts(byte_data))
+
+
+def open_pipe(name):
+    # Starts an ffmpeg process that remuxes an MPEG-TS stream read from stdin
+    # into an mp4 file (stream copy, no temp files)
+    output_file = temp_file_path(name, '.mp4')
+    process = (
         ffmpeg
-        .concat(*video_files)
-        .output(output_file, loglevel='quiet')
-        .run(overwrite_output=True)
+        .input('pipe:', f='mpegts')
+        .output(output_file, c='copy', an=None, loglevel='quiet')
+        .overwrite_output()
+        .run_async(pipe_stdin=True)
     )
+    return (process, output_file)
+
+
+def close_pipe(process):
+    # Ends the stream and waits for ffmpeg to finish writing the file
+    process.stdin.close()
+    if process.wait() != 0:
+        raise ffmpeg.Error('ffmpeg', None, None)
+
+
+def pipe(name, shards):
+    # Streams shard bytes in order into one ffmpeg process
+
+    print('Applying pipe...')
+    print(f'\tinput       : {len(shards)} shards')
+    print(f'\tname        : {name}')
+    print('\tstatus      : processing...', end='')
+
+    process, output_file = open_pipe(name)
+    try:
+        for shard_data in shards:
+            process.stdin.write(shard_data)
+    except BrokenPipeError:
+        # ffmpeg gave up, close_pipe reports it
+        pass
+    close_pipe(process)
 
     print('done')
     print(f'\toutput file : {os.path.basename(output_file)}')
@@ -227,6 +435,56 @@ def create_shard(input_file_path, output_file_path, start, end):
     )
 
 
+def cut(input_file_path, output_file_path, start, end, copy=False):
+    # Create a video shard between start and end seconds, seeking the input
+    # (only decodes from the keyframe before start, not from the beginning)
+    # copy stream copies instead of re-encoding, start must be a keyframe
+
+    codec = {'c': 'copy'} if copy else {}
+    (
+        ffmpeg
+        .input(input_file_path, ss=start, t=end - start)
+        .output(output_file_path, an=None, loglevel='quiet', **codec)
+        .run(overwrite_output=True)
+    )
+
+
+def segment(input_file_path, output_file_pattern, times, copy=False):
+    # Split a video into shards at the given times in one pass over the input
+    # Keyframes are forced at the split points, so every shard starts on one
+    # copy stream copies instead of re-encoding, the times must be keyframes
+
+    split_times = ','.join(f'{t:.6f}' for t in times)
+    codec = {'c': 'copy'} if copy else {'force_key_frames': split_times}
+    (
+        ffmpeg
+        .input(input_file_path)
+        .output(output_file_pattern, an=None, f='segment', segment_times=split_times,
+                reset_timestamps=1, loglevel='quiet', **codec)
+        .run(overwrite_output=True)
+    )
+
+
+def open_segmenter(output_file_pattern, times, copy=False):
+    # Starts an ffmpeg process that splits a video read from stdin into shards
+    # at the given times as the bytes arrive (see segment), and prints
+    # "file,start,end" to stdout as soon as each shard is complete
+    # The input must have its index up front (a faststart mp4 or MPEG-TS)
+
+    split_times = ','.join(f'{t:.6f}' for t in times)
+    codec = {'c': 'copy'} if copy else {'force_key_frames': split_times}
+    process = (
+        ffmpeg
+        .input('pipe:')
+        .output(output_file_pattern, an=None, f='segment', segment_times=split_times,
+                segment_list='pipe:1', segment_list_type='csv',
+                reset_timestamps=1, loglevel='quiet', **codec)
+        .overwrite_output()
+        .run_async(pipe_stdin=True, pipe_stdout=True)
+    )
+    return process
+
+
 def write(name, shard_data):
 
     # Writes a shard to disk as a temporary .mp4 file
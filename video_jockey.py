@@ -1,6 +1,9 @@
 import time
+from concurrent.futures import ThreadPoolExecutor
 
+import assembler
 import config
+import transport as tr
 import video
 from config import logger
 
@@ -10,12 +13,30 @@ class VideoJockey(object):
     Video Jockey (Marshmello) class - receives shards and assembles the video
     '''
 
-    def __init__(self):
-        '''Initialize the VJ with an empty buffer for all 128 shards'''
+    def __init__(self, shard_ends=None):
+        '''
+        Initialize the VJ with an empty buffer for all 128 shards
+        
+        Args:
+            shard_ends: Optional end time in seconds of each shard (see
+                        shard.load_shard_ends), to time the playback prefix
+        '''
         self.__name = 'Marshmello'
         # Buffer to hold all 128 shards in order
         self.__shards = [None] * config.NUM_SHARDS
         self.__shards_received = 0
+        # The lowest shard still missing (every shard below it is in)
+        self.__watermark = 0
+        # Shards needed in order before playback could start, and how long after
+        # the VJ started receiving they were all in
+        self.__prefix_shards = self.playback_prefix_shards(shard_ends)
+        self.__prefix_time = None
+        self.__start_time = None
+        # Writes the contiguous prefix to disk as it grows (VJ_ASSEMBLY 'incremental'),
+        # created in the VJ process
+        self.__assembler = None
+        # Shards still arriving in chunks: shard_id -> [{seq: chunk}, total chunks]
+        self.__chunks = {}
 
     def name(self):
         return self.__name
@@ -26,117 +47,195 @@ class VideoJockey(object):
     def shards_received(self):
         return self.__shards_received
 
+    def watermark(self):
+        return self.__watermark
+
+    def prefix_time(self):
+        return self.__prefix_time
+
+    def playback_prefix_shards(self, shard_ends):
+        '''
+        Get the number of shards that cover the first PLAYBACK_PREFIX_SECONDS
+        of video (PLAYBACK_PREFIX_SHARDS if the shard times aren't known)
+        '''
+        if not shard_ends:
+            return min(config.PLAYBACK_PREFIX_SHARDS, config.NUM_SHARDS)
+        for i, end in enumerate(shard_ends):
+            if end >= config.PLAYBACK_PREFIX_SECONDS:
+                return i + 1
+        return len(shard_ends)
+
     def has_all_shards(self):
         '''Check if VJ has received all shards'''
         return self.__shards_received >= config.NUM_SHARDS
 
-    def __read_shard_from_shared_buffer(self, shared_buffer):
+    def __read_shard_from_shared_buffer(self, transport):
         '''
-        Read a shard from the shared buffer
-        Tries all 4 slots in round-robin fashion
-        Blocks until a shard is available
+        Read a shard from the fans
+        Sleeps until a shard arrives (no polling)
         
         Args:
-            shared_buffer: The shared buffer object
+            transport: The transport object (see transport.Transport)
             
         Returns:
             tuple: (shard_id, byte_data, sender_name) or None if VJ has all shards
         '''
-        slot_index = 0
-        
         while not self.has_all_shards():
-            # Try to acquire lock for this slot
-            lock = shared_buffer.lock(slot_index)
-            
-            # Try to acquire the lock (non-blocking - pass False as positional arg for Python 3.13 compatibility)
-            if lock.acquire(False):  # Changed from lock.acquire(block=False)
-                try:
-                    # Check if slot has data
-                    if shared_buffer.is_slot_full(slot_index):
-                        # Read the data
-                        sender_name = shared_buffer.sender_name(slot_index)
-                        shard_id = shared_buffer.shard_id(slot_index)
-                        byte_data = shared_buffer.byte_data(slot_index)
-                        
-                        # Clear the slot (make it empty for fans to use)
-                        shared_buffer.clear_slot(slot_index)
-                        
-                        logger.debug(f'{self.__name} read shard {shard_id} from shared buffer slot {slot_index} (from {sender_name})')
-                        
-                        return (shard_id, byte_data, sender_name)
-                finally:
-                    # Always release the lock
-                    lock.release()
-            
-            # Move to next slot (round-robin)
-            slot_index = (slot_index + 1) % config.SHARED_BUFFER_SIZE
-            
-            # Small delay to avoid busy-waiting
-            time.sleep(0.001)
+            result = transport.receive(config.SHARED_BUFFER_TIMEOUT)
+            if result is not None:
+                return result
         
         return None
 
-    def __read_all_shards(self, shared_buffer):
+    def __store_chunk(self, shard_id, byte_data, seq, flags):
+        '''
+        Copy a chunk into its position in the shard it belongs to
+        
+        Args:
+            shard_id: ID of the shard the chunk belongs to
+            byte_data: The chunk's byte data
+            seq: Chunk number within the shard
+            flags: LAST_CHUNK if this is the shard's final chunk
+            
+        Returns:
+            The whole shard's byte data once every chunk is in, otherwise None
+        '''
+        # A whole shard in one message
+        if seq == 0 and flags & tr.LAST_CHUNK:
+            return byte_data
+        
+        if shard_id not in self.__chunks:
+            self.__chunks[shard_id] = [{}, None]
+        chunks = self.__chunks[shard_id]
+        
+        # Chunks can arrive in any order, and their size depends on who split
+        # the shard (the fan's CHUNK_SIZE or a transport's slot size)
+        chunks[0][seq] = byte_data
+        if flags & tr.LAST_CHUNK:
+            chunks[1] = seq + 1
+        
+        if len(chunks[0]) != chunks[1]:
+            return None
+        del self.__chunks[shard_id]
+        return b''.join(chunks[0][i] for i in range(chunks[1]))
+
+    def __advance_watermark(self, transport):
+        '''
+        Move the watermark past the contiguous shards now in, hand them to the
+        prefix assembler, publish the watermark with DELIVERY 'edf' and note
+        when the playback prefix is complete
+        '''
+        while self.__watermark < config.NUM_SHARDS and self.__shards[self.__watermark] is not None:
+            self.__watermark += 1
+        
+        # Start writing the shards that just joined the prefix
+        if self.__assembler is not None:
+            for i in range(self.__assembler.num_appended(), self.__watermark):
+                self.__assembler.append(i, self.__shards[i])
+        
+        if config.DELIVERY == 'edf':
+            transport.set_watermark(self.__watermark)
+        
+        if self.__prefix_time is None and self.__watermark >= self.__prefix_shards:
+            self.__prefix_time = time.time() - self.__start_time
+            logger.info(f'{self.__name} has the first {self.__prefix_shards} shards in order after {self.__prefix_time:.2f} seconds')
+
+    def __store_shard(self, shard_id, byte_data, sender_name, transport):
+        '''
+        Store a whole shard in its position in the shard buffer
+        
+        Args:
+            shard_id: ID of the shard
+            byte_data: The shard's byte data
+            sender_name: Name of the fan that sent it
+            transport: The transport object (to publish the watermark)
+        '''
+        if self.__shards[shard_id] is None:
+            self.__shards[shard_id] = byte_data
+            self.__shards_received += 1
+            if shard_id == self.__watermark:
+                self.__advance_watermark(transport)
+            
+            # Log progress periodically
+            if self.__shards_received % 16 == 0 or self.__shards_received == config.NUM_SHARDS:
+                logger.info(f'{self.__name} received shard {shard_id} from {sender_name}. Progress: {self.__shards_received}/{config.NUM_SHARDS} shards')
+        else:
+            logger.warning(f'{self.__name} received duplicate shard {shard_id} from {sender_name}')
+
+    def __read_all_shards(self, transport):
         '''
-        Read all shards from shared buffer and store them in order
+        Read all shards from the fans and store them in order
         
         Args:
-            shared_buffer: The shared buffer object
+            transport: The transport object (see transport.Transport)
             
         Returns:
             bool: True if all shards received successfully
         '''
-        logger.info(f'{self.__name} starting to receive shards from shared buffer')
+        logger.info(f'{self.__name} starting to receive shards from the fans')
+        self.__start_time = time.time()
+        if config.VJ_ASSEMBLY == 'incremental':
+            self.__assembler = assembler.PrefixAssembler()
         
         while not self.has_all_shards():
             # Read a shard from shared buffer
-            result = self.__read_shard_from_shared_buffer(shared_buffer)
+            result = self.__read_shard_from_shared_buffer(transport)
             
             if result is None:
                 break
             
-            shard_id, byte_data, sender_name = result
+            shard_id, byte_data, sender_name, seq, flags = result
+            
+            # A batch packs several whole shards
+            if flags & tr.BATCH:
+                for shard_id, byte_data in tr.unpack_batch(byte_data):
+                    self.__store_shard(shard_id, byte_data, sender_name, transport)
+                continue
             
-            # Store shard in the correct position
+            # Ignore chunks of a shard that's already complete
+            if self.__shards[shard_id] is not None and not (flags & tr.LAST_CHUNK):
+                continue
+            
+            # Reassemble chunked shards, wait for the rest of the chunks
             if self.__shards[shard_id] is None:
-                self.__shards[shard_id] = byte_data
-                self.__shards_received += 1
-                
-                # Log progress periodically
-                if self.__shards_received % 16 == 0 or self.__shards_received == config.NUM_SHARDS:
-                    logger.info(f'{self.__name} received shard {shard_id} from {sender_name}. Progress: {self.__shards_received}/{config.NUM_SHARDS} shards')
-            else:
-                logger.warning(f'{self.__name} received duplicate shard {shard_id} from {sender_name}')
+                byte_data = self.__store_chunk(shard_id, byte_data, seq, flags)
+                if byte_data is None:
+                    continue
+            
+            self.__store_shard(shard_id, byte_data, sender_name, transport)
         
         # Signal to all fans that VJ has all shards
-        shared_buffer.vj_has_all_shards.value = True
+        transport.done()
         
         logger.info(f'{self.__name} has received all {config.NUM_SHARDS} shards!')
         return True
 
     def __write_video(self):
         '''
-        Write all shards to disk as individual video files, then concatenate them
+        Write the shards out in order as one video
+        Shards that can be piped (see video.can_pipe) are streamed straight into
+        one ffmpeg process. Otherwise they're written to disk as individual
+        video files and concatenated. With VJ_ASSEMBLY 'incremental' most of
+        the shards were already written while the rest were arriving, only the
+        tail is left
         
         Returns:
-            str: Path to the concatenated video file
+            str: Path to the video file
         '''
-        logger.info(f'{self.__name} writing shards to disk')
-        
-        # Write all the shards to disk
-        all_temp_file_paths = []
         for i in range(len(self.__shards)):
             if self.__shards[i] is None:
                 logger.error(f'ERROR: Shard {i} is missing!')
                 return None
-            
-            shard_data = self.__shards[i]
-            video_file_path = video.write(f'shard_{i}', shard_data)
-            all_temp_file_paths.append(video_file_path)
-            
-            # Log progress
-            if (i + 1) % 32 == 0 or i == len(self.__shards) - 1:
-                logger.info(f'{self.__name} wrote {i + 1}/{len(self.__shards)} shards to disk')
+        
+        if self.__assembler is not None:
+            logger.info(f'{self.__name} waiting for the prefix assembler to write the tail')
+            return self.__assembler.finish()
+        
+        if video.can_pipe(self.__shards[0]):
+            logger.info(f'{self.__name} piping all shards into one video')
+            return video.pipe('concat_all', self.__shards)
+        
+        all_temp_file_paths = self.__write_shards()
         
         # Concatenate all the shards into one video
         logger.info(f'{self.__name} concatenating all shards into one video')
@@ -144,17 +243,35 @@ class VideoJockey(object):
         
         return output_file_path
 
-    def start(self, shared_buffer):
+    def __write_shards(self):
+        '''
+        Write all shards to disk as individual video files, VJ_WRITE_WORKERS
+        at a time
+        
+        Returns:
+            list: The shard file paths in playback order
+        '''
+        logger.info(f'{self.__name} writing shards to disk')
+        
+        # Write all the shards to disk
+        names = [f'shard_{i}' for i in range(len(self.__shards))]
+        with ThreadPoolExecutor(max_workers=config.VJ_WRITE_WORKERS) as executor:
+            all_temp_file_paths = list(executor.map(video.write, names, self.__shards))
+        
+        logger.info(f'{self.__name} wrote {len(all_temp_file_paths)}/{len(self.__shards)} shards to disk')
+        return all_temp_file_paths
+
+    def start(self, transport):
         '''
         Main entry point for the VJ process
         
         Args:
-            shared_buffer: The shared buffer object
+            transport: The transport object (see transport.Transport)
         '''
         logger.info(f'*** {self.__name} (VJ) started ***')
         
-        # Step 1: Read all shards from shared buffer
-        has_all_shards = self.__read_all_shards(shared_buffer)
+        # Step 1: Read all shards from the fans
+        has_all_shards = self.__read_all_shards(transport)
         
         if has_all_shards:
             logger.info(f'*** SUCCESS! {self.__name} has all {config.NUM_SHARDS} shards! ***')
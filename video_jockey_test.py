@@ -3,6 +3,7 @@ from unittest.mock import patch
 
 import config
 import shared_buffer as sb
+import transport
 import video_jockey
 from config import logger
 
@@ -78,4 +79,76 @@ def test_start():
         lock = manager.Lock()
         lock.acquire()
         shared_buffer.buffer()[i] = (lock, f'fan{i}', byte_data)
-    vj.start(shared_buffer)
\ No newline at end of file
+    vj.start(shared_buffer)
+
+
+@patch('config.CHUNK_SIZE', 4)
+def test_store_chunk():
+    vj = video_jockey.VideoJockey()
+    store_chunk = vj._VideoJockey__store_chunk
+    assert store_chunk(0, b'beef', 0, 1) == b'beef'
+    assert store_chunk(1, b'f0', 2, 1) is None
+    assert store_chunk(1, b'beef', 0, 0) is None
+    assert store_chunk(1, b'cafe', 1, 0) == b'beefcafef0'
+
+
+def test_store_uneven_chunks():
+    vj = video_jockey.VideoJockey()
+    store_chunk = vj._VideoJockey__store_chunk
+    assert store_chunk(2, b'f0', 1, 1) is None
+    assert store_chunk(2, b'beefcafe', 0, 0) == b'beefcafef0'
+
+
+@patch('config.NUM_SHARDS', 4)
+@patch('config.PLAYBACK_PREFIX_SECONDS', 5)
+@patch('config.DELIVERY', 'edf')
+@patch('config.VJ_ASSEMBLY', 'batch')
+def test_watermark():
+    vj = video_jockey.VideoJockey([2.5, 5.0, 7.5, 10.0])
+    t = transport.QueueTransport()
+    for shard_id in [1, 3, 0]:
+        t.send('fan0', shard_id, b'beef')
+    t.send('fan0', 2, transport.pack_batch([(2, b'cafe')]), 0, transport.BATCH | transport.LAST_CHUNK)
+    vj._VideoJockey__start_time = 0
+    receive = vj._VideoJockey__read_all_shards
+    assert receive(t)
+    assert vj.watermark() == 4
+    assert t.watermark() == 4
+    assert vj.prefix_time() is not None
+
+
+def test_playback_prefix_shards():
+    vj = video_jockey.VideoJockey()
+    with patch('config.PLAYBACK_PREFIX_SECONDS', 6):
+        assert vj.playback_prefix_shards([2.5, 5.0, 7.5, 10.0]) == 3
+        assert vj.playback_prefix_shards([2.5]) == 1
+
+
+@patch('config.NUM_SHARDS', 3)
+@patch('config.VJ_ASSEMBLY', 'incremental')
+@patch('config.VJ_OUTPUT', 'files')
+def test_incremental_assembly(tmp_path):
+    vj = video_jockey.VideoJockey()
+    t = transport.QueueTransport()
+    for shard_id in [1, 0, 2]:
+        t.send('fan0', shard_id, bytes([shard_id]))
+    with patch('config.TEMP_DIR', str(tmp_path)), patch('video.concat') as concat:
+        assert vj._VideoJockey__read_all_shards(t)
+        vj._VideoJockey__write_video()
+    file_paths = concat.call_args[0][1:]
+    assert [open(file_path, 'rb').read() for file_path in file_paths] == [b'\0', b'\1', b'\2']
+
+
+@patch('config.NUM_SHARDS', 3)
+@patch('config.VJ_ASSEMBLY', 'batch')
+@patch('config.VJ_OUTPUT', 'files')
+def test_write_shards(tmp_path):
+    vj = video_jockey.VideoJockey()
+    t = transport.QueueTransport()
+    for shard_id in [2, 0, 1]:
+        t.send('fan0', shard_id, bytes([shard_id]))
+    with patch('config.TEMP_DIR', str(tmp_path)), patch('video.concat') as concat:
+        assert vj._VideoJockey__read_all_shards(t)
+        vj._VideoJockey__write_video()
+    file_paths = concat.call_args[0][1:]
+    assert [open(file_path, 'rb').read() for file_path in file_paths] == [b'\0', b'\1', b'\2']
@@ -1,7 +1,11 @@
 import os
+from unittest.mock import patch
 
 import config
+import ffmpeg
 import video
+from hash_cache import HashCache
+from probe_cache import ProbeCache
 
 
 def test_end_reached_cb():
@@ -67,3 +71,73 @@ def test_write_shard():
     name = 'write_shard_test'
     output_file_path = video.write(name, b'beef')
     assert os.path.exists(output_file_path)
+
+
+def test_can_stream_copy():
+    h264 = {'codec_name': 'h264', 'profile': 'High', 'width': 1920, 'height': 1080,
+            'pix_fmt': 'yuv420p', 'time_base': '1/15360'}
+    with patch('video.probe', side_effect=[h264, dict(h264)]):
+        assert video.can_stream_copy('a.mp4', 'b.mp4')
+    with patch('video.probe', side_effect=[h264, dict(h264, width=1280)]):
+        assert not video.can_stream_copy('a.mp4', 'b.mp4')
+
+
+@patch('config.CONCAT_MODE', 'copy')
+def test_concat_copy_fallback(tmp_path):
+    input_file_path = tmp_path / 'a.mp4'
+    input_file_path.write_bytes(b'beef')
+    error = ffmpeg.Error('ffmpeg', b'', b'')
+    with patch('config.TEMP_DIR', str(tmp_path)), \
+            patch('video.concat_copy', side_effect=error) as concat_copy, \
+            patch('video.concat_filter') as concat_filter:
+        assert video.concat('test', str(input_file_path))
+    concat_copy.assert_called_once()
+    concat_filter.assert_called_once()
+
+
+def test_audio_mux_codecs():
+    with patch('video.probe', return_value={'codec_name': 'h264'}), \
+            patch('video.probe_audio', return_value={'codec_name': 'mp3'}):
+        assert video.audio_mux_codecs('a.mp4', 'a.mp3') == ('copy', 'copy')
+    with patch('video.probe', return_value={'codec_name': 'prores'}), \
+            patch('video.probe_audio', return_value={'codec_name': 'pcm_s16le'}):
+        assert video.audio_mux_codecs('a.mov', 'a.wav') == ('libx264', 'aac')
+
+
+def test_is_mpegts():
+    packet = bytes([0x47]) + bytes(187)
+    assert video.is_mpegts(packet * 3)
+    assert not video.is_mpegts(packet[:100])
+    assert not video.is_mpegts(b'\0\0\0\x18ftypmp42' + bytes(366))
+
+
+def test_probe_cached(tmp_path):
+    file_path = str(tmp_path / 'shard.mp4')
+    with open(file_path, 'wb') as file:
+        file.write(b'beef')
+    probe = {'streams': [{'codec_type': 'video', 'width': 640, 'height': 360}], 'format': {'duration': '2.0'}}
+    with patch('video.probe_cache', ProbeCache(size=4)), \
+            patch('ffmpeg.probe', return_value=probe) as ffprobe:
+        assert video.dimensions(file_path) == (640, 360)
+        assert video.duration(file_path) == 2.0
+        assert video.probe(file_path)['width'] == 640
+    ffprobe.assert_called_once()
+
+
+def test_read_file_hash(tmp_path):
+    file_path = str(tmp_path / 'shard.mp4')
+    byte_data = bytes(range(256)) * 10
+    with open(file_path, 'wb') as file:
+        file.write(byte_data)
+    # chunked, and the same hash as hashing the whole file at once
+    with patch('config.HASH_CHUNK_SIZE', 100):
+        assert video.read_file_hash(file_path) == video.shake256_hash(byte_data.decode('latin-1'))
+
+
+def test_file_hashes(tmp_path):
+    file_paths = [str(tmp_path / f'shard_{i}.mp4') for i in range(3)]
+    for i, file_path in enumerate(file_paths):
+        with open(file_path, 'wb') as file:
+            file.write(bytes([i]) * 8)
+    with patch('video.hash_cache', HashCache(video.read_file_hash)):
+        assert video.file_hashes(file_paths, 2) == [video.read_file_hash(file_path) for file_path in file_paths]
@@ -1,4 +1,10 @@
+import os
+
+import config
+import downloader
+import ingest_cache
 import pytubefix
+import pytubefix.extract
 from config import logger
 
 
@@ -29,6 +35,16 @@ def video_file_name(d_video):
 
 def download(url):
 
+    # use the cached stream while it's fresh (and always when offline)
+    video_id = pytubefix.extract.video_id(url)
+    stream = ingest_cache.get_stream(video_id)
+    if stream is not None:
+        logger.info(f'using the cached stream for {url}')
+        return ingest_cache.CachedVideo(stream)
+    if config.INGEST_OFFLINE:
+        logger.warning(f'WARNING: {url} is not in the ingest cache (offline)')
+        raise FileNotFoundError(ingest_cache.stream_path(video_id))
+
     # download video
     logger.info(f'downloading video for {url}')
     try:
@@ -42,20 +58,39 @@ def download(url):
 
 
 def get_video(yt):
+    if isinstance(yt, ingest_cache.CachedVideo):
+        return yt.stream
+
     # get streams w/ video and audio
     mp4_streams = yt.streams.filter(progressive=True)
 
     # get highest resolution
     d_video = mp4_streams[-1]
 
-    return d_video
+    # cache the chosen stream for the next run
+    return ingest_cache.put_stream(yt.video_id, d_video, yt.length)
 
 
 def write_video(d_video, video_dir, file_name):
+    file_path = os.path.join(video_dir, file_name)
+
+    # the download is reused while it matches its checksum
+    media_file_path = ingest_cache.get_media(d_video)
+    if media_file_path is not None:
+        logger.info(f'using the cached download {media_file_path}')
+        ingest_cache.copy_media(media_file_path, file_path)
+        return
+    if config.INGEST_OFFLINE:
+        logger.warning(f'WARNING: {d_video.video_id} has no cached download (offline)')
+        raise FileNotFoundError(ingest_cache.media_path(d_video.video_id, d_video.itag))
 
-    # downloading the video
+    # downloading the video into the cache with concurrent range requests, resumed if interrupted
+    media_file_path = ingest_cache.media_path(d_video.video_id, d_video.itag)
     try:
-        d_video.download(output_path=video_dir, filename=file_name)
+        os.makedirs(config.INGEST_CACHE_DIR, exist_ok=True)
+        downloader.download(d_video.url, media_file_path, d_video.filesize)
+        ingest_cache.put_media(d_video, media_file_path)
+        ingest_cache.copy_media(media_file_path, file_path)
     except Exception as e:
         logger.warning(
             f'WARNING: Unable to write video for {video_dir} exception={type(e).__name__}')